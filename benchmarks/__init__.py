@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of Reveal.yaml, run with "python -m benchmarks.<name>"."""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""Synthetic decks for the benchmarks."""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Dict, Any
+
+_DOC = """Lorem ipsum dolor sit amet, **consectetur** adipiscing elit.
+
++ Sed do eiusmod tempor incididunt
++ Ut labore et dolore magna aliqua
++ [Link](https://example.com/)
+
+```python
+def f(x: int) -> int:
+    return x * 2
+```
+"""
+
+
+def _hit(i: int, density: float) -> bool:
+    """Evenly distribute the features over the slides by its density."""
+    return density > 0 and int(i * density) != int((i + 1) * density)
+
+
+def make_deck(
+    slides: int,
+    *,
+    sub: int = 4,
+    img: float = 0.3,
+    include: float = 0.,
+    math: float = 0.1,
+) -> Dict[str, Any]:
+    """Generate the YAML data of a deck with specified number of slides.
+
+    Each horizontal slide has "sub" vertical slides, the densities are the
+    proportions of the slides that have images, includes and math.
+    """
+    nav = []
+    for i in range(slides):
+        n: Dict[str, Any] = {'title': f"Slide {i}", 'doc': _DOC}
+        if _hit(i, img):
+            n['img'] = [{'src': f"img/{i}.png", 'label': f"Figure {i}",
+                         'width': "300px"}]
+        if _hit(i, include):
+            n['include'] = f"doc/{i}.md"
+        if _hit(i, math):
+            n['math'] = r"\int_0^\infty e^{-x^2} dx = \frac{\sqrt{\pi}}{2}"
+            n['fragment'] = {'math': 'fade-in'}
+        if i % (sub + 1) == 0:
+            n['sub'] = []
+            nav.append(n)
+        else:
+            nav[-1]['sub'].append(n)
+    return {
+        'title': "Benchmark",
+        'description': f"A synthetic deck with {slides} slides",
+        'watermark': "img/watermark.png",
+        'watermark-size': "100px",
+        'footer': {'src': "img/icon.png", 'label': "Benchmark",
+                   'width': "30px"},
+        'nav': nav,
+    }
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+"""Memory benchmark of the slide model.
+
+Measure the memory retained by the constructed decks, excluding the
+parsed YAML data that the model shares its strings with.
+"""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Tuple, List, Dict, Any
+from gc import collect
+from argparse import ArgumentParser
+import tracemalloc
+from reveal_yaml.utility import valid_config
+from reveal_yaml.slides import Config
+from .decks import make_deck
+
+
+def measure(data: Dict[str, Any], decks: int) -> Tuple[int, int]:
+    """Return the retained and the peak memory of the decks in bytes."""
+    collect()
+    tracemalloc.start()
+    resident: List[Config] = [Config(**data) for _ in range(decks)]
+    collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del resident
+    return retained, peak
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('SIZES', nargs='*', type=int,
+                        default=[100, 1000, 10000], help="number of slides")
+    parser.add_argument('--decks', default=1, type=int,
+                        help="number of the resident decks of each size")
+    args = parser.parse_args()
+    print(f"{'slides':>8} {'retained (KiB)':>15} {'peak (KiB)':>11} "
+          f"{'per slide (B)':>14}")
+    for size in args.SIZES:
+        data = valid_config(make_deck(size))
+        retained, peak = measure(data, args.decks)
+        per_slide = retained / (size * args.decks)
+        print(f"{size:>8} {retained / 1024:>15.1f} {peak / 1024:>11.1f} "
+              f"{per_slide:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
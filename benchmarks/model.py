@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""Micro-benchmark of the slide model construction.
+
+Compare "Config(**data)" with the compiled field plans against the legacy
+implementation, which resolves the type hints on every assignment.
+"""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Dict, Any
+from contextlib import contextmanager
+from timeit import repeat
+from argparse import ArgumentParser
+from reveal_yaml.utility import valid_config
+from reveal_yaml.slides import TypeChecker, Config, cast_to, get_type_hints
+from .decks import make_deck
+
+
+def _legacy_setattr(self, key, value):
+    object.__setattr__(self, key, cast_to(
+        key, get_type_hints(self.__class__).get(key, None), value))
+
+
+@contextmanager
+def legacy():
+    """Use the legacy type checker."""
+    setattr_func = TypeChecker.__setattr__
+    TypeChecker.__setattr__ = _legacy_setattr  # type: ignore
+    try:
+        yield
+    finally:
+        TypeChecker.__setattr__ = setattr_func  # type: ignore
+
+
+def bench(data: Dict[str, Any], number: int) -> float:
+    """Return the best time of the construction in seconds."""
+    return min(repeat(lambda: Config(**data), number=number,
+                      repeat=5)) / number
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('SIZES', nargs='*', type=int,
+                        default=[10, 100, 1000], help="number of slides")
+    args = parser.parse_args()
+    print(f"{'slides':>8} {'legacy (ms)':>12} {'compiled (ms)':>14} "
+          f"{'speedup':>8}")
+    for size in args.SIZES:
+        data = valid_config(make_deck(size))
+        number = max(1, 1000 // size)
+        with legacy():
+            t0 = bench(data, number)
+        t1 = bench(data, number)
+        print(f"{size:>8} {t0 * 1e3:>12.3f} {t1 * 1e3:>14.3f} "
+              f"{t0 / t1:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
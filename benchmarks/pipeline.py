@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark of the compile and pack pipeline.
+
+Generate the synthetic decks, and time each stage separately with its
+peak memory. The remote files are served by a local CDN stand-in, so it
+runs offline. The results are written in JSON, and can be compared with
+a previous result to catch the regressions.
+"""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import List, Dict, Callable, Optional, Any
+from sys import stdout, stderr, version
+from os import environ, makedirs, walk
+from os.path import join, getsize
+from platform import platform
+from shutil import rmtree
+from statistics import mean
+from collections import deque
+from tempfile import mkdtemp
+from time import perf_counter, time
+from json import dump, load, dumps, loads
+from argparse import ArgumentParser
+import tracemalloc
+from yaml import safe_load, safe_dump
+from tests.cdn import CDN
+from .decks import make_deck
+
+# A transparent 1x1 PNG image
+_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44"
+    "ae426082")
+STAGES = ('safe_load', 'valid_config', 'schema', 'config', 'render',
+          'render_warm', 'stream_warm', 'copy_project', 'copy_project_warm',
+          'editor')
+
+
+def make_project(path: str, slides: int, cdn: str, *, img: float,
+                 include: float, math: float) -> str:
+    """Write the synthetic project, return its YAML path."""
+    deck = make_deck(slides, img=img, include=include, math=math)
+    deck['cdn'] = cdn
+    makedirs(join(path, 'static', 'doc'))
+    for n in deck['nav']:
+        for m in [n] + n['sub']:
+            if 'include' not in m:
+                continue
+            with open(join(path, 'static', m['include']), 'w',
+                      encoding='utf-8') as f:
+                f.write(f"Included paragraph of {m['title']}.\n")
+    project = join(path, "reveal.yaml")
+    with open(project, 'w', encoding='utf-8') as f:
+        safe_dump(deck, f, sort_keys=False)
+    return project
+
+
+def dir_size(path: str) -> int:
+    """Total size of the files under the directory."""
+    return sum(getsize(join(root, name))
+               for root, _, names in walk(path) for name in names)
+
+
+def clear_asset_cache() -> None:
+    """Remove the downloaded files."""
+    from reveal_yaml.cache import asset_cache
+    cache = asset_cache()
+    for folder in (cache.blobs, cache.meta):
+        rmtree(folder, ignore_errors=True)
+        makedirs(folder)
+
+
+def bench(
+    size: int,
+    cdn: CDN,
+    repeat: int,
+    density: Dict[str, float],
+    skip: List[str]
+) -> Dict[str, Any]:
+    """Run the stages of a deck, return the results."""
+    from reveal_yaml.utility import valid_config
+    from reveal_yaml.slides import (
+        Config, render_slides, stream_slides, copy_project, find_project,
+        validate_config, section_cache,
+    )
+    from reveal_yaml.slides_app import app
+    from reveal_yaml import editor
+    root = mkdtemp(prefix='rym_bench_')
+    project_dir = join(root, 'project')
+    project = make_project(project_dir, size, cdn.url, **density)
+    build = join(root, 'build')
+    find_project(app, project_dir)
+    stages: Dict[str, Dict[str, float]] = {}
+
+    def stage(
+        name: str,
+        func: Callable[[], Any],
+        setup: Optional[Callable[[], None]] = None
+    ) -> Any:
+        """Time the stage with the best of the repeats, then measure its
+        peak memory in another run.
+        """
+        if name in skip:
+            return func()
+        times = []
+        value = None
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+            t0 = perf_counter()
+            value = func()
+            times.append(perf_counter() - t0)
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        stages[name] = {'best': min(times), 'mean': mean(times),
+                        'peak': peak}
+        return value
+
+    with open(project, 'r', encoding='utf-8') as f:
+        text = f.read()
+    data = stage('safe_load', lambda: safe_load(text))
+    data = stage('valid_config', lambda: valid_config(dict(data)))
+    stage('schema', lambda: validate_config(data))
+    config = stage('config', lambda: Config(**data))
+    with app.test_request_context():
+        html = stage('render', lambda: render_slides(config),
+                     section_cache.clear)
+        stage('render_warm', lambda: render_slides(config))
+        # The chunks are dropped as a streamed response does
+        stage('stream_warm', lambda: deque(stream_slides(config), 0))
+
+    def cold_build() -> None:
+        """Start from an empty build folder and asset cache."""
+        rmtree(build, ignore_errors=True)
+        clear_asset_cache()
+        section_cache.clear()
+
+    requests = len(cdn.requests)
+    with app.app_context():
+        stage('copy_project', lambda: copy_project(config, project_dir,
+                                                   build), cold_build)
+        downloads = (len(cdn.requests) - requests) // (repeat + 1)
+        stage('copy_project_warm',
+              lambda: copy_project(config, project_dir, build))
+    client = editor.app.test_client()
+    # Initialize the editor outside the timing
+    client.get('/preview/0')
+    find_project(app, project_dir)
+    raw = safe_load(text)
+
+    def round_trip() -> str:
+        """Post the config then get its preview."""
+        res_id = loads(client.post('/preview/0', json=raw).data)['id']
+        r = client.get(f'/preview/{res_id}')
+        assert r.status_code == 200, r.status
+        return r.get_data(as_text=True)
+
+    def cold_preview() -> None:
+        """Drop the rendered previews and slides."""
+        editor.previews.clear()
+        section_cache.clear()
+
+    stage('editor', round_trip, cold_preview)
+    result = {
+        'slides': size,
+        'density': density,
+        'stages': stages,
+        'html_size': len(html.encode('utf-8')),
+        'build_size': dir_size(build),
+        'downloads': downloads,
+    }
+    rmtree(root, ignore_errors=True)
+    return result
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: Dict[str, Any],
+    tolerance: float
+) -> List[str]:
+    """Return the stages that are slower than the baseline over the
+    tolerance ratio.
+    """
+    old = {r['slides']: r['stages'] for r in baseline['results']}
+    regressions = []
+    for r in results:
+        for name, s in r['stages'].items():
+            b = old.get(r['slides'], {}).get(name)
+            if b is None or b['best'] <= 0:
+                continue
+            ratio = s['best'] / b['best']
+            if ratio > 1 + tolerance:
+                regressions.append(f"{r['slides']} slides, {name}: "
+                                   f"{b['best'] * 1e3:.3f} ms -> "
+                                   f"{s['best'] * 1e3:.3f} ms "
+                                   f"({ratio:.2f}x)")
+    return regressions
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('SIZES', nargs='*', type=int,
+                        default=[10, 100, 1000, 10000],
+                        help="number of slides")
+    parser.add_argument('--img', default=0.3, type=float,
+                        help="density of the images")
+    parser.add_argument('--include', default=0.1, type=float,
+                        help="density of the includes")
+    parser.add_argument('--math', default=0.1, type=float,
+                        help="density of the math")
+    parser.add_argument('-r', '--repeat', default=3, type=int,
+                        help="number of the timed runs of each stage")
+    parser.add_argument('--skip', nargs='*', default=[], choices=STAGES,
+                        help="skip the timing of the stages")
+    parser.add_argument('-o', '--output', default="", type=str,
+                        help="write the results to the file")
+    parser.add_argument('--compare', default="", type=str,
+                        help="compare with the baseline results, exit with "
+                             "an error if any stage regressed")
+    parser.add_argument('--tolerance', default=0.25, type=float,
+                        help="allowed slowdown ratio of the comparison")
+    args = parser.parse_args()
+    tmp = mkdtemp(prefix='rym_bench_cache_')
+    # Isolate the caches before they are created
+    environ['RYM_CACHE_DIR'] = tmp
+    environ['RYM_PREVIEW_STORE'] = 'memory'
+    environ['RYM_EDITOR_DB'] = join(tmp, 'swap.db')
+    cdn = CDN()
+    # Any path is an image
+    cdn.fallback(_PNG, Content_Type='image/png', Cache_Control='max-age=3600')
+    cdn.start()
+    density = {'img': args.img, 'include': args.include, 'math': args.math}
+    results = []
+    try:
+        for size in args.SIZES:
+            stderr.write(f"benchmarking {size} slides...\n")
+            results.append(bench(size, cdn, args.repeat, density,
+                                 args.skip))
+    finally:
+        cdn.stop()
+        rmtree(tmp, ignore_errors=True)
+    from reveal_yaml import __version__
+    report = {
+        'version': __version__,
+        'python': version,
+        'platform': platform(),
+        'time': time(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            dump(report, f, indent=2)
+    else:
+        stdout.write(dumps(report, indent=2) + '\n')
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, load(f), args.tolerance)
+        for line in regressions:
+            stderr.write(f"regression: {line}\n")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
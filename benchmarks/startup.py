@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark of the import time of the commands.
+
+Each command imports its modules in a fresh interpreter, and the best of
+the runs is compared with the budget of the command. The modules that the
+command should not load at the startup are also checked, it exits with an
+error if any budget is exceeded.
+"""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Tuple, List, Dict, Any
+from sys import executable, stdout, stderr
+from subprocess import run, PIPE
+from json import dumps, loads
+from argparse import ArgumentParser
+
+# Imported modules, the budget in milliseconds, and the forbidden modules
+COMMANDS: Dict[str, Tuple[List[str], float, List[str]]] = {
+    'cli': (["reveal_yaml.__main__"], 20,
+            ["flask", "yaml", "jsonschema", "requests", "argcomplete"]),
+    'cache': (["reveal_yaml.cache"], 30,
+              ["flask", "jsonschema", "requests", "dataset"]),
+    'pack': (["reveal_yaml.slides", "reveal_yaml.slides_app"], 300,
+             ["jsonschema", "requests", "dataset", "sqlalchemy"]),
+    'serve': (["reveal_yaml.slides", "reveal_yaml.slides_app",
+               "reveal_yaml.utility"], 300,
+              ["jsonschema", "requests", "dataset", "sqlalchemy"]),
+    'editor': (["reveal_yaml.slides", "reveal_yaml.editor"], 300,
+               ["jsonschema", "requests", "dataset", "sqlalchemy"]),
+}
+_SCRIPT = """\
+import sys
+from time import perf_counter
+from json import dumps
+t0 = perf_counter()
+for name in {modules!r}:
+    __import__(name)
+t = perf_counter() - t0
+print(dumps({{'time': t, 'loaded': [name for name in {forbidden!r}
+                                    if name in sys.modules]}}))
+"""
+
+
+def measure(modules: List[str], forbidden: List[str]) -> Dict[str, Any]:
+    """Import the modules in a new interpreter, return the import time and
+    the loaded forbidden modules.
+    """
+    p = run([executable, '-c', _SCRIPT.format(modules=modules,
+                                              forbidden=forbidden)],
+            stdout=PIPE, check=True, universal_newlines=True)
+    return loads(p.stdout)
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('COMMANDS', nargs='*', default=list(COMMANDS),
+                        help=f"commands to measure: {', '.join(COMMANDS)}")
+    parser.add_argument('-r', '--repeat', default=5, type=int,
+                        help="number of the runs of each command")
+    parser.add_argument('--scale', default=1., type=float,
+                        help="scale the budgets for the slower machines")
+    parser.add_argument('--json', action='store_true',
+                        help="print the results in JSON")
+    args = parser.parse_args()
+    for cmd in args.COMMANDS:
+        if cmd not in COMMANDS:
+            parser.error(f"unknown command: {cmd}")
+    results = {}
+    failures = []
+    for cmd in args.COMMANDS:
+        modules, budget, forbidden = COMMANDS[cmd]
+        runs = [measure(modules, forbidden) for _ in range(args.repeat)]
+        best = min(r['time'] for r in runs) * 1e3
+        budget *= args.scale
+        loaded = runs[0]['loaded']
+        results[cmd] = {'best': best, 'budget': budget, 'loaded': loaded}
+        if best > budget:
+            failures.append(f"{cmd}: {best:.1f} ms over the budget "
+                            f"{budget:.1f} ms")
+        if loaded:
+            failures.append(f"{cmd}: loaded {', '.join(loaded)}")
+    if args.json:
+        stdout.write(dumps(results, indent=2) + '\n')
+    else:
+        for cmd, r in results.items():
+            stdout.write(f"{cmd:<8}{r['best']:>8.1f} ms / "
+                         f"{r['budget']:.1f} ms\n")
+    for line in failures:
+        stderr.write(f"over budget: {line}\n")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,9 +7,8 @@ __email__ = "pyslvs@gmail.com"
 
 from argparse import ArgumentParser
 from sys import stdout
-from os import getcwd
-from os.path import join, abspath, dirname, isfile, isdir
-from argcomplete import autocomplete
+from os import getcwd, environ
+from os.path import join, abspath, relpath, dirname, isfile, isdir
 from reveal_yaml import __version__
 
 
@@ -40,6 +39,28 @@ def main() -> None:
                      help="project path")
     sub.add_argument('-o', '--dist', nargs='?', default="", type=str,
                      help="dist path")
+    sub.add_argument('-j', '--jobs', default=8, type=int,
+                     help="number of concurrent downloads")
+    sub.add_argument('--fingerprint', action='store_true',
+                     help="rename the assets with their content hashes, "
+                          "and write the compressed siblings")
+    sub.add_argument('--bundle', action='store_true',
+                     help="bundle the scripts and inline the small styles")
+    sub.add_argument('--batch', nargs='+', default=[], type=str,
+                     metavar='PATTERN',
+                     help="pack the project folders or glob patterns in "
+                          "parallel, each output is under the dist path by "
+                          "its name, or in its build folder")
+    sub.add_argument('--workers', default=0, type=int,
+                     help="number of the batch processes, default is the "
+                          "number of processors")
+    sub = s.add_parser('cache', help="manage the downloaded asset cache")
+    sub.add_argument('ACTION', choices=('stats', 'prune'),
+                     help="show the statistics or remove the least recently "
+                          "used entries")
+    sub.add_argument('--max-size', default=None, type=int,
+                     help="prune to the size in MiB, "
+                          "default is RYM_CACHE_SIZE")
     for cmd, doc in (
         ('serve', "project"),
         ('editor', "project for edit mode (preserve)"),
@@ -52,7 +73,26 @@ def main() -> None:
         sub.add_argument('--ip', default='localhost', type=str,
                          help="IP address")
         sub.add_argument('--port', default=0, type=int, help="specified port")
-    autocomplete(parser)
+        sub.add_argument('--workers', default=0, type=int,
+                         help="number of the WSGI server worker processes, "
+                              "default is the development server")
+        sub.add_argument('--metrics', action='store_true',
+                         help="report the Server-Timing headers and serve "
+                              "the metrics at /metrics")
+        if cmd == 'serve':
+            sub.add_argument('--watch', action='store_true',
+                             help="recompile and reload the browsers when "
+                                  "the files are changed")
+            sub.add_argument('--root', default="", type=str,
+                             help="serve the projects under the folder by "
+                                  "their names")
+            sub.add_argument('--bundle', action='store_true',
+                             help="bundle the scripts and inline the small "
+                                  "styles")
+    if '_ARGCOMPLETE' in environ:
+        # Shell completion mode, it exits after completed
+        from argcomplete import autocomplete
+        autocomplete(parser)
     args = parser.parse_args()
     if args.cmd == 'init':
         # Create a project
@@ -72,6 +112,27 @@ def main() -> None:
         if not (isfile(join(args.PATH, "reveal.yaml"))
                 or isfile(join(args.PATH, "reveal.yml"))):
             copy_file(join(root, "blank.yaml"), join(args.PATH, "reveal.yaml"))
+    elif args.cmd == 'pack' and args.batch:
+        from time import perf_counter
+        from reveal_yaml.batch import expand_projects, pack_batch
+        t0 = perf_counter()
+        results = pack_batch(expand_projects(args.batch),
+                             abspath(args.dist) if args.dist else "",
+                             workers=args.workers, jobs=args.jobs,
+                             fingerprint=args.fingerprint, bundle=args.bundle)
+        failed = 0
+        for r in results:
+            path = relpath(r['path'], pwd)
+            if r['error']:
+                failed += 1
+                stdout.write(f"FAIL {r['time']:8.2f}s {path}: {r['error']}\n")
+            else:
+                stdout.write(f"ok   {r['time']:8.2f}s {path} -> "
+                             f"{relpath(r['dist'], pwd)}\n")
+        stdout.write(f"{len(results) - failed} packed, {failed} failed "
+                     f"in {perf_counter() - t0:.2f}s\n")
+        if failed:
+            raise SystemExit(1)
     elif args.cmd == 'pack':
         from reveal_yaml.slides import find_project, pack
         from reveal_yaml.slides_app import app
@@ -81,19 +142,45 @@ def main() -> None:
             return
         if not args.dist:
             args.dist = join(args.PATH, 'build')
-        pack(args.PATH, args.dist, app)
+        pack(args.PATH, args.dist, app, jobs=args.jobs,
+             fingerprint=args.fingerprint, bundle=args.bundle)
+    elif args.cmd == 'cache':
+        from reveal_yaml.cache import asset_cache
+        cache = asset_cache()
+        if args.ACTION == 'prune':
+            n = cache.prune(None if args.max_size is None
+                            else args.max_size << 20)
+            stdout.write(f"removed {n} entries\n")
+        for key, value in cache.stats().items():
+            stdout.write(f"{key}: {value}\n")
     elif args.cmd in {'serve', 'editor', 'doc'}:
         from reveal_yaml.slides import find_project
+        if args.metrics:
+            from reveal_yaml.metrics import enable
+            enable()
         args.PATH = root if args.cmd == 'doc' else abspath(args.PATH)
         if args.cmd == 'editor':
             from reveal_yaml.editor import app  # type: ignore
+        elif args.cmd == 'serve' and args.root:
+            from reveal_yaml.slides_app import app, host_projects
+            app.config['BUNDLE'] = args.bundle
+            args.PATH = abspath(args.root)
+            host_projects(args.PATH)
         else:
             from reveal_yaml.slides_app import app
+            if args.cmd == 'serve':
+                app.config['BUNDLE'] = args.bundle
             if not find_project(app, args.PATH):
                 stdout.write("fatal: project is not found")
                 return
+            if args.cmd == 'serve' and args.watch:
+                if args.workers:
+                    stdout.write("fatal: watch mode needs a single process")
+                    return
+                from reveal_yaml.slides_app import watch
+                watch()
         from reveal_yaml.utility import serve
-        serve(args.PATH, app, args.ip, args.port)
+        serve(args.PATH, app, args.ip, args.port, workers=args.workers)
     else:
         parser.print_help()
 
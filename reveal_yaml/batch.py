@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import List, Dict, Iterable, Any
+from os import cpu_count
+from os.path import join, abspath, basename, isdir
+from glob import glob
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+
+def expand_projects(patterns: Iterable[str]) -> List[str]:
+    """Expand the folders and the glob patterns into the project folders,
+    the duplicated folders are removed.
+
+    The matched folders without a project are skipped, but the folders
+    that are given directly are kept, so they are reported if not found.
+    """
+    from .slides import project_yaml
+    paths: Dict[str, None] = {}
+    for pattern in patterns:
+        matched = glob(pattern, recursive=True)
+        if not matched or matched == [pattern]:
+            paths[abspath(pattern)] = None
+            continue
+        for path in sorted(matched):
+            if isdir(path) and project_yaml(path):
+                paths[abspath(path)] = None
+    return list(paths)
+
+
+def _error_text(e: BaseException) -> str:
+    """The error name and the first line of its message."""
+    lines = str(e).strip().splitlines()
+    return type(e).__name__ + (f": {lines[0]}" if lines else "")
+
+
+def _pack_one(path: str, dist: str, jobs: int, fingerprint: bool,
+              bundle: bool) -> Dict[str, Any]:
+    """Pack a project in the worker process, the errors are reported in
+    the result instead of raised.
+    """
+    t0 = perf_counter()
+    error = ""
+    try:
+        from .slides import project_yaml, pack
+        from .slides_app import app
+        if not project_yaml(path):
+            raise FileNotFoundError("project is not found")
+        # The asset cache is shared, it is pruned after the batch
+        pack(path, dist, app, jobs=jobs, fingerprint=fingerprint,
+             bundle=bundle, prune=False)
+    except Exception as e:
+        error = _error_text(e)
+    return {'path': path, 'dist': dist, 'time': perf_counter() - t0,
+            'error': error}
+
+
+def pack_batch(paths: List[str], dist: str = "", *, workers: int = 0,
+               jobs: int = 8, fingerprint: bool = False,
+               bundle: bool = False) -> List[Dict[str, Any]]:
+    """Pack the projects in a process pool, return the results in order.
+
+    The output of each project is its "build" folder, or the folder of
+    its name under "dist" if given. The number of "workers" is the number
+    of processors by default. A failed project does not stop the others,
+    its error is recorded in the result, including the crash of its
+    worker process.
+    """
+    names: Dict[str, str] = {}
+    results: List[Dict[str, Any]] = []
+    futures = []
+    with ProcessPoolExecutor(workers or cpu_count()) as executor:
+        for path in paths:
+            if dist:
+                name = basename(path)
+                output = join(dist, name)
+                if name in names:
+                    results.append({'path': path, 'dist': output, 'time': 0.,
+                                    'error': f"output is conflicted with "
+                                             f"{names[name]}"})
+                    continue
+                names[name] = path
+            else:
+                output = join(path, 'build')
+            try:
+                futures.append((len(results), executor.submit(
+                    _pack_one, path, output, jobs, fingerprint, bundle)))
+            except Exception as e:
+                # The pool is broken by a crashed worker
+                results.append({'path': path, 'dist': output, 'time': 0.,
+                                'error': _error_text(e)})
+                continue
+            results.append({'path': path, 'dist': output})
+        for i, future in futures:
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i].update(time=0., error=_error_text(e))
+    from .cache import asset_cache
+    asset_cache().prune()
+    return results
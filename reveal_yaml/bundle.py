@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Tuple, List, Callable
+from os import replace, utime
+from os.path import join, isfile
+from hashlib import sha1
+from tempfile import mkstemp
+from .cache import LRUCache, file_stamp, asset_cache
+from .utility import ROOT
+from .metrics import registry
+
+# Inline the stylesheets up to this size
+INLINE_MAX = 8 << 10
+
+
+def _minifier() -> Tuple[str, Callable[[str], str]]:
+    """Return the name and the function of the JavaScript minifier,
+    the scripts are only concatenated if "rjsmin" is not installed.
+    """
+    try:
+        from rjsmin import jsmin  # type: ignore
+    except ImportError:
+        return "", lambda script: script
+    return "rjsmin", jsmin
+
+
+def bundle_folder() -> str:
+    """The folder of the bundles in the asset cache."""
+    return asset_cache().folder('bundle')
+
+
+def static_source(static_dir: str, path: str) -> str:
+    """Return the project file, or the file shipped with the package."""
+    local = join(static_dir, path)
+    return local if isfile(local) else join(ROOT, 'static', path)
+
+
+def bundle_scripts(plugins: List[str]) -> List[str]:
+    """The scripts of the enabled plugins in the import order."""
+    return (["reveal.js/reveal.js"]
+            + [f"plugin/{name}/{name}.js" for name in plugins]
+            + ["js/jquery.min.js"])
+
+
+# Map the sources and their stamps to the bundle names
+_bundles: LRUCache[str] = LRUCache(64)
+registry.register_cache('bundle', _bundles)
+
+
+def build_bundle(static_dir: str, plugins: List[str]) -> str:
+    """Concatenate and minify the scripts of the enabled plugins into a
+    bundle, return its filename in the bundle folder.
+
+    The bundle is named by the digest of its sources, so each plugin set
+    has one bundle, and it is only built when the sources are changed.
+    The used bundle is touched, and rebuilt if it is pruned.
+    """
+    srcs = [static_source(static_dir, path)
+            for path in bundle_scripts(plugins)]
+    name, minify = _minifier()
+    key = repr((name, [(src, file_stamp(src)) for src in srcs]))
+
+    def build() -> str:
+        """Build the bundle if not exist."""
+        scripts = []
+        for src in srcs:
+            with open(src, 'r', encoding='utf-8') as f:
+                scripts.append(f.read())
+        h = sha1(name.encode('utf-8'))
+        for script in scripts:
+            h.update(script.encode('utf-8'))
+        filename = h.hexdigest()[:16] + '.js'
+        path = join(bundle_folder(), filename)
+        if isfile(path):
+            return filename
+        data = ";\n".join(
+            script if src.endswith('.min.js') else minify(script)
+            for src, script in zip(srcs, scripts))
+        fd, tmp = mkstemp(dir=bundle_folder(), suffix='.part')
+        with open(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        replace(tmp, path)
+        return filename
+
+    filename = _bundles.get(key, build)
+    try:
+        utime(join(bundle_folder(), filename))
+    except OSError:
+        _bundles.discard(key)
+        filename = _bundles.get(key, build)
+    return filename
+
+
+def inline_style(static_dir: str, path: str) -> str:
+    """Return the small stylesheet content, or empty if it is too large or
+    has the relative references.
+    """
+    src = static_source(static_dir, path)
+    if not isfile(src) or file_stamp(src)[1] > INLINE_MAX:
+        return ""
+    with open(src, 'r', encoding='utf-8') as f:
+        style = f.read()
+    if 'url(' in style or '@import' in style:
+        return ""
+    return style
@@ -0,0 +1,611 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import (
+    TypeVar, Generic, Tuple, List, Sequence, Dict, FrozenSet, Hashable,
+    Iterable, Iterator, Callable, Optional, Set, Any, TYPE_CHECKING,
+)
+from collections import OrderedDict
+from os import (
+    stat, environ, makedirs, replace, remove, utime, scandir, walk, sep,
+)
+from os.path import join, expanduser, isfile, relpath, normpath, realpath
+from hashlib import sha1, sha256
+from json import load, dump
+from re import search
+from urllib.parse import urlparse
+from tempfile import mkstemp
+from time import time
+from threading import Thread, Lock
+
+if TYPE_CHECKING:
+    from requests import Session
+
+_Stamp = Tuple[int, int]
+V = TypeVar('V')
+
+
+def file_stamp(path: str) -> _Stamp:
+    """Return the modified time and size of the file, or zeros if missing."""
+    try:
+        st = stat(path)
+    except OSError:
+        return 0, -1
+    return st.st_mtime_ns, st.st_size
+
+
+def file_digest(path: str) -> str:
+    """Return the SHA-1 digest of the file content."""
+    h = sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DeckCache:
+    """Compiled deck cache, invalidated by the stamps of its source files.
+
+    The remote source files are listed by their URLs, the deck is expired
+    when any of their cached entries is expired, then it is compiled again
+    with the revalidated entries.
+
+    The deck is kept in the encoded chunks, so it can be sent without
+    joined.
+    """
+    # Minimum interval of the recompilation of the expired remote files
+    RECHECK = 1.
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.stamps: Tuple[Tuple[str, _Stamp], ...] = ()
+        self.expires = 0.
+        self.chunks: Tuple[bytes, ...] = ()
+        self.etag = ""
+
+    def fresh(self) -> bool:
+        """Return true if none of the source files are changed or expired."""
+        return bool(self.chunks) and time() < self.expires and all(
+            file_stamp(path) == s for path, s in self.stamps)
+
+    @staticmethod
+    def expiry(urls: Iterable[str], since: float) -> float:
+        """Return the earliest expiry of the cached remote files.
+
+        The files fetched after the time "since" may be newer than the
+        compiled ones, so they are expired.
+        """
+        expires = float('inf')
+        cache = asset_cache()
+        for url in urls:
+            meta = cache.lookup(url)
+            if meta is None or meta['fetched'] >= since:
+                return 0.
+            expires = min(expires, meta['fetched'] + meta['max_age'])
+        return expires
+
+    def get(
+        self,
+        compile_func: Callable[[], Tuple[Iterable[str], Sequence[str]]]
+    ) -> Tuple[Tuple[bytes, ...], str]:
+        """Return the HTML chunks and the strong ETag, compile it if expired.
+
+        The compile function returns the HTML chunks and its source files,
+        the remote files are listed by their URLs.
+        """
+        with self.lock:
+            if not self.fresh():
+                since = time()
+                html, files = compile_func()
+                self.update((chunk.encode('utf-8') for chunk in html), files,
+                            since)
+            return self.chunks, self.etag
+
+    def update(self, chunks: Iterable[bytes], files: Sequence[str],
+               since: float) -> None:
+        """Replace the compiled deck by its chunks and source files, "since"
+        is the time before the compilation.
+        """
+        h = sha1()
+        done = []
+        for chunk in chunks:
+            h.update(chunk)
+            done.append(chunk)
+        files = list(dict.fromkeys(files))
+        urls = [path for path in files
+                if urlparse(path).scheme in {'http', 'https'}]
+        self.stamps = tuple((path, file_stamp(path))
+                            for path in files if path not in urls)
+        self.expires = max(self.expiry(urls, since), time() + self.RECHECK)
+        self.chunks = tuple(done)
+        self.etag = h.hexdigest()
+
+    def clear(self) -> None:
+        """Drop the compiled deck."""
+        with self.lock:
+            self.stamps = ()
+            self.expires = 0.
+            self.chunks = ()
+            self.etag = ""
+
+
+class LRUCache(Generic[V]):
+    """Thread-safe least recently used cache with hit / miss counters."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.lock = Lock()
+        self.data: OrderedDict[Hashable, V] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: Hashable) -> Optional[V]:
+        """Return the cached value or None, and count the hit or miss."""
+        with self.lock:
+            if key in self.data:
+                self.hits += 1
+                self.data.move_to_end(key)
+                return self.data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: V) -> None:
+        """Store the value, evict the least recently used ones if full."""
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.capacity:
+                self.data.popitem(last=False)
+
+    def get(self, key: Hashable, factory: Callable[[], V]) -> V:
+        """Return the cached value, or create it by the factory."""
+        value = self.lookup(key)
+        if value is None:
+            # Create without the lock, the same value may be created twice
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def discard(self, key: Hashable) -> None:
+        """Drop the value if exist."""
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all the values and reset the counters."""
+        with self.lock:
+            self.data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the size and the counters."""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.data),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.,
+            }
+
+
+def dir_mtime(path: str) -> int:
+    """Return the modified time of the directory, or -1 if missing."""
+    try:
+        return stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+
+def walk_links(path: str) -> Iterator[Tuple[str, List[str], List[str]]]:
+    """Walk the folder like "os.walk", the linked folders are also walked,
+    except the links to their own ancestors.
+    """
+    ancestors = {path: {realpath(path)}}
+    for base, dirnames, filenames in walk(path, followlinks=True):
+        chain = ancestors.pop(base, set())
+        kept = []
+        for name in dirnames:
+            real = realpath(join(base, name))
+            if real in chain:
+                continue
+            kept.append(name)
+            ancestors[join(base, name)] = chain | {real}
+        dirnames[:] = kept
+        yield base, dirnames, filenames
+
+
+class StaticIndex:
+    """Index of the files under a static folder, the lookups are O(1).
+
+    Adding, removing or renaming a file changes the modified time of its
+    directory, so the index is rebuilt when any of the directory stamps
+    is changed. If the folder is "watched", the stamps are not checked, and
+    the watcher should invalidate the index instead.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = Lock()
+        self.files: FrozenSet[str] = frozenset()
+        self.dirs: Dict[str, int] = {}
+        self.valid = False
+        self.watched = False
+
+    def fresh(self) -> bool:
+        """Return true if none of the directories are changed."""
+        return all(dir_mtime(path) == m for path, m in self.dirs.items())
+
+    def build(self) -> None:
+        """Walk the folder."""
+        files: List[str] = []
+        dirs = {self.path: dir_mtime(self.path)}
+        for base, dirnames, filenames in walk_links(self.path):
+            rel = relpath(base, self.path).replace(sep, '/')
+            rel = "" if rel == '.' else rel + '/'
+            for name in dirnames:
+                dirs[join(base, name)] = dir_mtime(join(base, name))
+            files.extend(rel + name for name in filenames)
+        self.files = frozenset(files)
+        self.dirs = dirs
+        self.valid = True
+
+    def check(self) -> FrozenSet[str]:
+        """Rebuild the index if expired, return the relative file paths."""
+        with self.lock:
+            if not self.valid or (not self.watched and not self.fresh()):
+                self.build()
+            return self.files
+
+    def invalidate(self) -> None:
+        """Rebuild the index at the next check."""
+        with self.lock:
+            self.valid = False
+
+    def __contains__(self, path: str) -> bool:
+        """Return true if the relative path is a file, without checking."""
+        return normpath(path).replace(sep, '/') in self.files
+
+
+static_indexes: LRUCache[StaticIndex] = LRUCache(64)
+
+
+def static_index(path: str) -> StaticIndex:
+    """Return the checked index of the static folder."""
+    index = static_indexes.get(path, lambda: StaticIndex(path))
+    index.check()
+    return index
+
+
+class AssetCache:
+    """Persistent content-addressed cache of the remote files.
+
+    The blobs are named by their SHA-256 digests, and each URL has a
+    metadata file that records the blob and its validators. The entries
+    are fresh before their max-age (or the default TTL), then they are
+    revalidated with ETag / Last-Modified. The least recently used
+    entries are pruned when the total size is over the capacity.
+
+    The stale entries can be served while they are revalidated in the
+    background, within the "stale-while-revalidate" window of the response
+    (or the default "stale" seconds).
+
+    The files derived from the sources are stored in the "DERIVED" folders,
+    they share the capacity and are pruned by their used time.
+    """
+    DERIVED = ('static', 'bundle')
+
+    def __init__(self, path: str, capacity: int, ttl: float,
+                 stale: float = 0.) -> None:
+        self.path = path
+        self.capacity = capacity
+        self.ttl = ttl
+        self.stale = stale
+        self.lock = Lock()
+        self.pending: Set[str] = set()
+        self.blobs = join(path, 'blobs')
+        self.meta = join(path, 'meta')
+        makedirs(self.blobs, exist_ok=True)
+        makedirs(self.meta, exist_ok=True)
+
+    def folder(self, name: str) -> str:
+        """Return the derived folder of the name."""
+        if name not in self.DERIVED:
+            raise ValueError(f"not a derived folder: {name}")
+        path = join(self.path, name)
+        makedirs(path, exist_ok=True)
+        return path
+
+    def meta_path(self, url: str) -> str:
+        """Return the metadata path of the URL."""
+        return join(self.meta, sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the metadata of the URL if its blob is exist."""
+        try:
+            with open(self.meta_path(url), 'r', encoding='utf-8') as f:
+                meta = load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url or not isfile(self.blob_path(meta)):
+            return None
+        return meta
+
+    def blob_path(self, meta: Dict[str, Any]) -> str:
+        """Return the blob path of the metadata."""
+        return join(self.blobs, meta['blob'])
+
+    def save(self, meta: Dict[str, Any]) -> None:
+        """Write the metadata atomically, it also marks the entry as used."""
+        fd, tmp = mkstemp(dir=self.meta, suffix='.tmp')
+        with open(fd, 'w', encoding='utf-8') as f:
+            dump(meta, f)
+        replace(tmp, self.meta_path(meta['url']))
+
+    def fetch(self, url: str, *, session: Optional[Session] = None,
+              timeout: float = 30., stale: bool = False) -> Dict[str, Any]:
+        """Return the metadata of the URL, download or revalidate if needed.
+
+        Fresh entries are returned without any request. If "stale" is
+        enabled, the stale entries in the window are returned and
+        revalidated in the background. If the server is unreachable, the
+        stale entry is returned.
+        """
+        from requests import Session as _Session, RequestException
+        meta = self.lookup(url)
+        now = time()
+        if meta is not None:
+            age = now - meta['fetched']
+            if age < meta['max_age'] or (
+                stale and age < meta['max_age'] + meta.get('stale', 0.)
+            ):
+                utime(self.meta_path(url))
+                if age >= meta['max_age']:
+                    self.revalidate(url, session=session, timeout=timeout)
+                return meta
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        try:
+            r = (session or _Session()).get(url, headers=headers, stream=True,
+                                            timeout=timeout)
+        except RequestException:
+            if meta is None:
+                raise
+            return meta
+        with r:
+            cache_control = r.headers.get('Cache-Control', "")
+            max_age = self.max_age(cache_control)
+            m = search(r"stale-while-revalidate=(\d+)", cache_control)
+            stale_age = float(m.group(1)) if m else self.stale
+            if r.status_code == 304 and meta is not None:
+                meta.update(fetched=now, max_age=max_age, stale=stale_age)
+                self.save(meta)
+                return meta
+            r.raise_for_status()
+            fd, tmp = mkstemp(dir=self.blobs, suffix='.part')
+            h = sha256()
+            size = 0
+            try:
+                with open(fd, 'wb') as f:
+                    for chunk in r.iter_content(1 << 16):
+                        h.update(chunk)
+                        size += len(chunk)
+                        f.write(chunk)
+            except BaseException:
+                remove(tmp)
+                raise
+            replace(tmp, join(self.blobs, h.hexdigest()))
+            old = None if meta is None else meta['blob']
+            meta = {
+                'url': url,
+                'blob': h.hexdigest(),
+                'size': size,
+                'encoding': r.encoding or 'utf-8',
+                'etag': r.headers.get('ETag', ""),
+                'last_modified': r.headers.get('Last-Modified', ""),
+                'fetched': now,
+                'max_age': max_age,
+                'stale': stale_age,
+            }
+        self.save(meta)
+        if old is not None and old != meta['blob']:
+            # The blobs of the other URLs are downloaded again if removed
+            try:
+                remove(join(self.blobs, old))
+            except OSError:
+                pass
+        return meta
+
+    def revalidate(self, url: str, *, session: Optional[Session] = None,
+                   timeout: float = 30.) -> None:
+        """Revalidate the entry in a background thread, at most one thread
+        for each URL.
+        """
+        with self.lock:
+            if url in self.pending:
+                return
+            self.pending.add(url)
+
+        def task() -> None:
+            """Fetch the URL, the failure keeps the stale entry."""
+            try:
+                self.fetch(url, session=session, timeout=timeout)
+            except Exception:
+                pass
+            finally:
+                with self.lock:
+                    self.pending.discard(url)
+
+        Thread(target=task, daemon=True).start()
+
+    def max_age(self, cache_control: str) -> float:
+        """Return the freshness lifetime from the Cache-Control header."""
+        if 'no-cache' in cache_control or 'no-store' in cache_control:
+            return 0.
+        m = search(r"max-age=(\d+)", cache_control)
+        return float(m.group(1)) if m else self.ttl
+
+    def entries(self) -> List[Tuple[float, str, Dict[str, Any]]]:
+        """Return the used time, metadata path and metadata of the entries,
+        the least recently used first.
+        """
+        entries = []
+        with scandir(self.meta) as it:
+            for e in it:
+                if not e.name.endswith('.json'):
+                    continue
+                try:
+                    with open(e.path, 'r', encoding='utf-8') as f:
+                        entries.append((e.stat().st_mtime, e.path, load(f)))
+                except (OSError, ValueError):
+                    continue
+        entries.sort(key=lambda e: e[0])
+        return entries
+
+    def blob_files(self) -> Dict[str, int]:
+        """Return the sizes of the blob files, including the ones that are
+        not referenced, but not the partial downloads.
+        """
+        blobs = {}
+        with scandir(self.blobs) as it:
+            for e in it:
+                if e.name.endswith('.part'):
+                    continue
+                try:
+                    blobs[e.name] = e.stat().st_size
+                except OSError:
+                    continue
+        return blobs
+
+    def derived_files(self) -> List[Tuple[float, str, int]]:
+        """Return the used time, path and size of the derived files,
+        the least recently used first.
+        """
+        files = []
+        for name in self.DERIVED:
+            root = join(self.path, name)
+            for path, _, names in walk(root):
+                for n in names:
+                    if n.endswith('.part'):
+                        continue
+                    try:
+                        st = stat(join(path, n))
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, join(path, n), st.st_size))
+        files.sort(key=lambda e: e[0])
+        return files
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of entries and the size of the blobs and the
+        derived files.
+        """
+        entries = self.entries()
+        blobs = self.blob_files()
+        derived = self.derived_files()
+        return {
+            'path': self.path,
+            'entries': len(entries),
+            'blobs': len(blobs),
+            'derived': len(derived),
+            'size': sum(blobs.values()) + sum(e[2] for e in derived),
+            'capacity': self.capacity,
+        }
+
+    def prune(self, capacity: Optional[int] = None) -> int:
+        """Remove the blobs that are not referenced, then the least recently
+        used entries and derived files until the total size is not greater
+        than the capacity, return the number of removed ones.
+        """
+        if capacity is None:
+            capacity = self.capacity
+        entries = self.entries()
+        refs: Dict[str, int] = {}
+        for _, _, meta in entries:
+            refs[meta['blob']] = refs.get(meta['blob'], 0) + 1
+        for name in self.blob_files().keys() - refs.keys():
+            try:
+                remove(join(self.blobs, name))
+            except OSError:
+                pass
+        derived = self.derived_files()
+        size = sum({meta['blob']: meta['size']
+                    for _, _, meta in entries}.values())
+        size += sum(e[2] for e in derived)
+        # Merge the entries and the derived files by their used time
+        used: List[Tuple[float, str, Optional[Dict[str, Any]], int]] = [
+            (t, path, meta, 0) for t, path, meta in entries]
+        used.extend((t, path, None, n) for t, path, n in derived)
+        used.sort(key=lambda e: e[0])
+        removed = 0
+        for _, path, meta, n in used:
+            if size <= capacity:
+                break
+            try:
+                remove(path)
+            except OSError:
+                continue
+            removed += 1
+            if meta is None:
+                size -= n
+                continue
+            refs[meta['blob']] -= 1
+            if refs[meta['blob']] == 0:
+                try:
+                    remove(self.blob_path(meta))
+                except OSError:
+                    pass
+                size -= meta['size']
+        # Remove the partial files of the killed processes
+        folders = [self.blobs] + [join(self.path, name)
+                                  for name in self.DERIVED]
+        for folder in folders:
+            for path, _, names in walk(folder):
+                for n in names:
+                    name = join(path, n)
+                    try:
+                        if (
+                            n.endswith('.part')
+                            and time() - stat(name).st_mtime > 60 * 60
+                        ):
+                            remove(name)
+                    except OSError:
+                        continue
+        return removed
+
+
+_ASSET_CACHE: Optional[AssetCache] = None
+
+
+def cache_dir() -> str:
+    """Return the cache folder of the user, set by "RYM_CACHE_DIR"."""
+    return environ.get('RYM_CACHE_DIR') or join(
+        environ.get('XDG_CACHE_HOME') or expanduser(join('~', '.cache')),
+        'reveal_yaml')
+
+
+def asset_cache() -> AssetCache:
+    """Return the asset cache of the process.
+
+    The environment variables "RYM_CACHE_DIR", "RYM_CACHE_SIZE" (in MiB),
+    "RYM_CACHE_TTL" and "RYM_CACHE_STALE" (in seconds) are the options.
+    """
+    global _ASSET_CACHE
+    if _ASSET_CACHE is None:
+        _ASSET_CACHE = AssetCache(
+            cache_dir(),
+            int(environ.get('RYM_CACHE_SIZE', 512)) << 20,
+            float(environ.get('RYM_CACHE_TTL', 24 * 60 * 60)),
+            float(environ.get('RYM_CACHE_STALE', 7 * 24 * 60 * 60)))
+    return _ASSET_CACHE
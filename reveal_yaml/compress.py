@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import List, Optional, Callable
+from os import stat, replace, utime
+from os.path import join, isfile
+from mimetypes import guess_type
+from io import BytesIO
+from hashlib import sha1
+from tempfile import mkstemp
+from flask import Response, request, send_file, abort
+from werkzeug.utils import safe_join
+from .cache import asset_cache
+
+# Vendor libraries are only changed after upgraded
+VENDOR = ('reveal.js/', 'plugin/', 'js/', 'ace/')
+VENDOR_MAX_AGE = 30 * 24 * 60 * 60
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json',
+                'application/xml', 'image/svg+xml')
+MIN_SIZE = 1 << 10
+
+
+def _compressor(encoding: str) -> Optional[Callable[[bytes], bytes]]:
+    """Return the compress function of the encoding if supported."""
+    if encoding == 'gzip':
+        from gzip import GzipFile
+
+        def gz_compress(data: bytes) -> bytes:
+            """Compress without the timestamp, so the output is stable."""
+            buf = BytesIO()
+            with GzipFile(fileobj=buf, mode='wb', compresslevel=9,
+                          mtime=0) as f:
+                f.write(data)
+            return buf.getvalue()
+
+        return gz_compress
+    if encoding == 'br':
+        try:
+            from brotli import compress as br_compress  # type: ignore
+        except ImportError:
+            return None
+        return br_compress
+    return None
+
+
+EXTENSIONS = {'gzip': '.gz', 'br': '.br'}
+
+
+def write_compressed(path: str, *, force: bool = False) -> List[str]:
+    """Write the compressed siblings of a compressible file, return their
+    paths. The existing siblings are kept unless forced.
+    """
+    mimetype = guess_type(path)[0] or ""
+    if not mimetype.startswith(COMPRESSIBLE):
+        return []
+    paths = []
+    data = None
+    for encoding, ext in EXTENSIONS.items():
+        compress = _compressor(encoding)
+        if compress is None:
+            continue
+        paths.append(path + ext)
+        if isfile(path + ext) and not force:
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        with open(path + ext, 'wb') as f:
+            f.write(compress(data))
+    return paths
+
+
+def compressed(path: str, encoding: str) -> str:
+    """Return the compressed variant of the file, create it at the first time.
+
+    The variants are stored in the asset cache by the path and the stamp
+    of the file, so they are shared by the workers and pruned with the
+    cache. The used variants are touched.
+    """
+    st = stat(path)
+    key = sha1(f"{path}:{st.st_mtime_ns}:{st.st_size}".encode('utf-8'))
+    folder = asset_cache().folder('static')
+    variant = join(folder, f"{key.hexdigest()}.{encoding}")
+    try:
+        utime(variant)
+    except OSError:
+        pass
+    else:
+        return variant
+    compress = _compressor(encoding)
+    if compress is None:
+        return path
+    with open(path, 'rb') as f:
+        data = compress(f.read())
+    fd, tmp = mkstemp(dir=folder, suffix='.part')
+    with open(fd, 'wb') as f:
+        f.write(data)
+    replace(tmp, variant)
+    return variant
+
+
+def send_compressed(folder: str, filename: str, *,
+                    vendor: bool = False) -> Response:
+    """Send a static file, in the precompressed variant that the client
+    accepts, with long-lived cache headers for the vendor libraries.
+
+    Set "vendor" to cache the file as a vendor library.
+    """
+    path = safe_join(folder, filename)
+    if path is None or not isfile(path):
+        abort(404)
+    mimetype = guess_type(path)[0] or 'application/octet-stream'
+    etag = compressed_etag(path)
+    encoding = None
+    if (
+        mimetype.startswith(COMPRESSIBLE)
+        and stat(path).st_size >= MIN_SIZE
+    ):
+        for name in ('br', 'gzip'):
+            if request.accept_encodings[name] > 0:
+                variant = compressed(path, name)
+                if variant != path:
+                    path = variant
+                    encoding = name
+                    break
+    response = send_file(path, mimetype=mimetype, conditional=False,
+                         etag=False)
+    response.set_etag(f"{etag}-{encoding or 'identity'}")
+    response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.content_encoding = encoding
+    if vendor or filename.replace('\\', '/').startswith(VENDOR):
+        response.cache_control.no_cache = None  # type: ignore
+        response.cache_control.public = True
+        response.cache_control.max_age = VENDOR_MAX_AGE
+    else:
+        response.cache_control.no_cache = True
+    response.make_conditional(request)
+    return response
+
+
+def compressed_etag(path: str) -> str:
+    """Return the ETag of the original file from its stamp."""
+    st = stat(path)
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
@@ -5,91 +5,221 @@ __copyright__ = "Copyright (C) 2019-2020"
 __license__ = "MIT"
 __email__ = "pyslvs@gmail.com"
 
-from typing import Union
-from os.path import basename, join
-from shutil import make_archive
+from typing import (
+    Union, Tuple, Iterable, Iterator, List, Dict, Any, TYPE_CHECKING,
+)
+from os import environ
+from os.path import join
 from io import BytesIO
-from tempfile import TemporaryDirectory
-from time import time_ns
-from json import loads
+from json import dumps
+from time import time
+from hashlib import sha256
 from yaml import safe_load
-from jsonschema import validate
-from flask import Flask, Response, render_template, request, jsonify, send_file
-from dataset import connect, Table
+from flask import (
+    Flask, Response, render_template, request, jsonify, send_file, abort,
+    stream_with_context,
+)
+from functools import lru_cache
 from reveal_yaml import __version__
-from .slides import Config, render_slides, copy_project, find_project
+from .slides import (
+    Config, render_slides, stream_slides, zip_project, find_project,
+    validate_config, render_files,
+)
 from .utility import load_file, valid_config, ROOT, PWD
+from .cache import LRUCache, DeckCache
+from .store import preview_store
+from .compress import send_compressed
+from .metrics import registry, instrument, timer
 
+if TYPE_CHECKING:
+    from dataset import Table
+
+_Data = Dict[str, Any]
 app = Flask(__name__)
-db = connect('sqlite:///' + join(ROOT, 'swap.db'))
-tb1: Table = db['doc']
-tb2: Table = db['schema']
-tb3: Table = db['swap']
+app.send_static_file = lambda filename: send_compressed(  # type: ignore
+    app.static_folder or "", filename)
+# Rendered previews and finished archives by the preview IDs
+previews: LRUCache[DeckCache] = LRUCache(64)
+archives: LRUCache[bytes] = LRUCache(8)
+registry.register_cache('preview', previews)
+registry.register_cache('archive', archives)
+instrument(app)
+store = preview_store()
+
+
+@lru_cache(maxsize=None)
+def doc_table() -> 'Table':
+    """The table of the documentation and the saved project, the database
+    is connected at the first use.
+
+    The path of the database is "RYM_EDITOR_DB", default is in the package.
+    """
+    from dataset import connect
+    path = environ.get('RYM_EDITOR_DB') or join(ROOT, 'swap.db')
+    return connect('sqlite:///' + path)['doc']
 
 
 @app.before_first_request
 def before_first_request() -> None:
-    if tb1.find_one(id=0) is not None:
-        return
+    with timer('db'):
+        tb1 = doc_table()
+        if tb1.find_one(id=0) is not None:
+            return
     config = valid_config(safe_load(load_file(join(ROOT, 'reveal.yaml'))))
-    tb1.insert({'id': 0, 'doc': render_slides(Config(**config))})
+    doc = render_slides(Config(**config))
     project = find_project(app, PWD) or join(ROOT, 'blank.yaml')
-    tb1.insert({'id': 1, 'doc': load_file(project)})
-    tb2.insert({'id': 0, 'json': loads(load_file(join(ROOT, 'schema.json')))})
+    saved = load_file(project)
+    from sqlalchemy.exc import IntegrityError
+    with timer('db'):
+        for i, text in enumerate((doc, saved)):
+            try:
+                tb1.insert({'id': i, 'doc': text})
+            except IntegrityError:
+                # Inserted by another worker that started together
+                pass
+
+
+def error_page(e: Exception) -> str:
+    """The page of the error traceback."""
+    from traceback import format_exc
+    return f"<pre>{format_exc()}\n{e}</pre>"
 
 
 @app.errorhandler(403)
 @app.errorhandler(410)
 @app.errorhandler(500)
-def server_error(e: Exception) -> str:
+def server_error(e: Exception) -> Tuple[str, int]:
     """Handle server error, especially for the previewer."""
-    from traceback import format_exc
-    return f"<pre>{format_exc()}\n{e}</pre>"
+    return error_page(e), getattr(e, 'code', 500)
+
+
+def check_config(config: _Data) -> _Data:
+    """Validate the posted config, the chapter files are rejected since
+    the posted config has no project folder.
+    """
+    validate_config(config)
+    nav = config.get('nav')
+    if isinstance(nav, list) and any(
+        isinstance(n, dict) and 'chapter' in n for n in nav
+    ):
+        raise ValueError("the chapter files are not supported by the "
+                         "editor, the posted config has no project folder")
+    return config
+
+
+def preview_id(data: _Data) -> int:
+    """Generate the ID from the canonical JSON of the config.
+
+    The ID is a 60-bit integer, which can be stored in SQLite.
+    """
+    doc = dumps(data, sort_keys=True, separators=(',', ':'),
+                ensure_ascii=False)
+    return int(sha256(doc.encode('utf-8')).hexdigest()[:15], 16)
 
 
 @app.route('/preview/<int:res_id>', methods=['GET', 'POST'])
-def preview(res_id: int) -> Union[str, Response]:
-    """Render preview."""
+def preview(res_id: int) -> Union[str, Tuple[str, int], Response]:
+    """Render preview.
+
+    The same configs share the same ID, and their rendered pages are
+    cached until the included files are changed or expired. The page is
+    streamed while it is rendered.
+    """
     if request.method == 'POST':
-        # Re-generate ID by time
-        res_id = time_ns()
-        tb3.insert({'id': res_id, 'json': request.get_json()})
-        if len(tb3) > 300:
-            tb3.delete(id=tb3.find_one(order_by=['id'])['id'])
+        data = request.get_json()
+        if not isinstance(data, dict):
+            abort(400)
+        res_id = preview_id(data)
+        store.put(res_id, data)
         # Use integers will loss the value!
         return jsonify(id=str(res_id))
     if res_id == 0:
-        return tb1.find_one(id=0)['doc']
-    config = tb3.find_one(id=res_id)['json']
-    try:
-        validate(config, tb2.find_one(id=0)['json'])
-    except Exception as e:
-        from traceback import format_exc
-        return f"<pre>{format_exc()}\n{e}</pre>"
-    return render_slides(Config(**valid_config(config)))
+        with timer('db'):
+            return doc_table().find_one(id=0)['doc']
+    chunks: Iterable[bytes]
+    cached = previews.lookup(res_id)
+    if cached is None or not cached.fresh():
+        data = store.get(res_id)
+        if data is None:
+            abort(410)
+        try:
+            check_config(data)
+        except Exception as e:
+            return error_page(e), 400
+        # The stored config is shared, copy it before renaming the keys
+        config = Config(**valid_config(dict(data)))
+        since = time()
+        html = stream_slides(config)
+
+        def stream() -> Iterator[bytes]:
+            """Stream the chunks, and cache the page after completed."""
+            done: List[bytes] = []
+            for chunk in html:
+                done.append(chunk.encode('utf-8'))
+                yield done[-1]
+            deck = DeckCache()
+            deck.update(done, render_files(config), since)
+            previews.put(res_id, deck)
+
+        chunks = stream_with_context(stream())
+        etag = ""
+    else:
+        chunks = cached.chunks
+        etag = cached.etag
+    response = Response(chunks, mimetype='text/html')
+    if etag:
+        response.set_etag(etag)
+    # Always revalidate, the included files may be changed
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+    return response
 
 
 @app.route('/pack/<int:res_id>')
-def pack(res_id: int) -> Response:
-    """Build and provide zip file for user download."""
-    row = tb3.find_one(id=res_id)
-    if row is None:
+def pack(res_id: int) -> Union[Tuple[str, int], Response]:
+    """Build and provide zip file for user download.
+
+    The archive is streamed while it is built, and the finished archives
+    are reused by the identical configs.
+    """
+    config = store.get(res_id)
+    if config is None:
         return send_file(BytesIO(), attachment_filename='empty.txt',
                          as_attachment=True)
-    with TemporaryDirectory(suffix=f"{res_id}") as path:
-        build_path = join(path, "reveal")
-        copy_project(Config(**row['json']), ROOT, build_path)
-        archive = make_archive(build_path, 'zip', build_path)
-        with open(archive, 'rb') as f:
-            mem = BytesIO(f.read())
-    archive = basename(archive)
-    return send_file(mem, as_attachment=True, attachment_filename=archive)
+    headers = {'Content-Disposition': "attachment; filename=reveal.zip"}
+    archive = archives.lookup(res_id)
+    if archive is not None:
+        response = Response(archive, mimetype='application/zip',
+                            headers=headers)
+    else:
+        try:
+            check_config(config)
+        except Exception as e:
+            return error_page(e), 400
+        chunks = zip_project(Config(**valid_config(dict(config))), ROOT)
+
+        def stream() -> Iterator[bytes]:
+            """Stream the chunks, and cache the archive after completed."""
+            done: List[bytes] = []
+            for chunk in chunks:
+                done.append(chunk)
+                yield chunk
+            archives.put(res_id, b"".join(done))
+
+        response = Response(stream_with_context(stream()),
+                            mimetype='application/zip', headers=headers)
+    response.set_etag(f"{res_id:x}")
+    response.make_conditional(request)
+    return response
 
 
 @app.route('/')
 def index() -> str:
     """The editor."""
+    with timer('db'):
+        saved = doc_table().find_one(id=1)['doc']
     return render_template("editor.html", version=__version__,
                            author=__author__, license=__license__,
                            copyright=__copyright__, email=__email__,
-                           saved=tb1.find_one(id=1)['doc'])
+                           saved=saved)
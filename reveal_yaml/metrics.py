@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import (
+    TypeVar, Tuple, List, Dict, Callable, Optional, Any, cast, TYPE_CHECKING,
+)
+from os import environ
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+from .cache import LRUCache
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+F = TypeVar('F', bound=Callable[..., Any])
+# Upper bounds of the latency buckets in seconds
+BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.)
+_ENABLED = environ.get('RYM_METRICS', '') not in {'', '0'}
+# Durations of the stages of the current request
+_timings: 'ContextVar[Optional[Dict[str, float]]]' = ContextVar(
+    '_timings', default=None)
+
+
+class Histogram:
+    """Cumulative latency histogram."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Record a value."""
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Counters and histograms of the stages, and the registered caches."""
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.stages: Dict[str, Histogram] = {}
+        self.errors: Dict[str, int] = {}
+        self.requests: Dict[Tuple[str, int], Histogram] = {}
+        self.caches: Dict[str, LRUCache] = {}
+
+    def observe(self, name: str, duration: float, failed: bool) -> None:
+        """Record a stage."""
+        with self.lock:
+            h = self.stages.get(name)
+            if h is None:
+                h = self.stages[name] = Histogram()
+            h.observe(duration)
+            if failed:
+                self.errors[name] = self.errors.get(name, 0) + 1
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.) + duration
+
+    def observe_request(self, endpoint: str, status: int,
+                        duration: float) -> None:
+        """Record a request."""
+        with self.lock:
+            h = self.requests.get((endpoint, status))
+            if h is None:
+                h = self.requests[endpoint, status] = Histogram()
+            h.observe(duration)
+
+    def register_cache(self, name: str, cache: LRUCache) -> None:
+        """Report the hit rate of the cache."""
+        self.caches[name] = cache
+
+    def exposition(self) -> str:
+        """Return the metrics in the Prometheus text format."""
+        lines: List[str] = []
+
+        def histogram(metric: str, labels: str, h: Histogram) -> None:
+            """Append the histogram lines."""
+            total = 0
+            for le, n in zip(BUCKETS + (float('inf'),), h.counts):
+                total += n
+                bound = '+Inf' if le == float('inf') else repr(le)
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} '
+                             f'{total}')
+            lines.append(f'{metric}_sum{{{labels}}} {h.sum}')
+            lines.append(f'{metric}_count{{{labels}}} {h.count}')
+
+        with self.lock:
+            lines.append("# TYPE rym_stage_seconds histogram")
+            for name, h in sorted(self.stages.items()):
+                histogram('rym_stage_seconds', f'stage="{name}"', h)
+            lines.append("# TYPE rym_stage_errors_total counter")
+            for name, n in sorted(self.errors.items()):
+                lines.append(f'rym_stage_errors_total{{stage="{name}"}} {n}')
+            lines.append("# TYPE rym_request_seconds histogram")
+            for (endpoint, status), h in sorted(self.requests.items()):
+                histogram('rym_request_seconds',
+                          f'endpoint="{endpoint}",status="{status}"', h)
+        for metric, kind, key in (
+            ('rym_cache_hits_total', 'counter', 'hits'),
+            ('rym_cache_misses_total', 'counter', 'misses'),
+            ('rym_cache_hit_ratio', 'gauge', 'hit_rate'),
+            ('rym_cache_size', 'gauge', 'size'),
+        ):
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, cache in sorted(self.caches.items()):
+                lines.append(f'{metric}{{cache="{name}"}} '
+                             f'{cache.stats()[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def enabled() -> bool:
+    """Return true if the instrumentation is enabled."""
+    return _ENABLED
+
+
+def enable(flag: bool = True) -> None:
+    """Enable or disable the instrumentation.
+
+    It is also enabled by the environment variable "RYM_METRICS".
+    """
+    global _ENABLED
+    _ENABLED = flag
+
+
+class timer:
+    """Context manager that records the duration of a stage.
+
+    Nothing is recorded when the instrumentation is disabled.
+    """
+    __slots__ = ('name', 't0')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.t0 = 0.
+
+    def __enter__(self) -> None:
+        if _ENABLED:
+            self.t0 = perf_counter()
+
+    def __exit__(self, exc_type: Any, *args: Any) -> None:
+        if _ENABLED and self.t0:
+            registry.observe(self.name, perf_counter() - self.t0,
+                             exc_type is not None)
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Decorator that records the duration of the function as a stage.
+
+    The classes are timed by their construction.
+    """
+    def decorator(func: F) -> F:
+        if isinstance(func, type):
+            init = getattr(func, '__init__')
+            setattr(func, '__init__', decorator(init))
+            return func
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _ENABLED:
+                return func(*args, **kwargs)
+            t0 = perf_counter()
+            failed = True
+            try:
+                value = func(*args, **kwargs)
+                failed = False
+                return value
+            finally:
+                registry.observe(name, perf_counter() - t0, failed)
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+def instrument(app: 'Flask') -> None:
+    """Report the stage timings of the requests in the "Server-Timing"
+    headers, and serve the metrics at "/metrics" if enabled.
+    """
+    from flask import Response, request, abort
+
+    @app.before_request
+    def start_timing() -> None:
+        if _ENABLED:
+            _timings.set({'total': perf_counter()})
+
+    @app.after_request
+    def server_timing(response: Response) -> Response:
+        timings = _timings.get()
+        if not _ENABLED or timings is None:
+            return response
+        _timings.set(None)
+        duration = perf_counter() - timings.pop('total')
+        registry.observe_request(request.endpoint or "", response.status_code,
+                                 duration)
+        response.headers['Server-Timing'] = ', '.join(
+            [f"{name};dur={t * 1e3:.3f}" for name, t in timings.items()]
+            + [f"total;dur={duration * 1e3:.3f}"])
+        return response
+
+    @app.route('/metrics')
+    def metrics() -> Response:
+        """Metrics in the Prometheus text format."""
+        if not _ENABLED:
+            abort(404)
+        return Response(registry.exposition(),
+                        mimetype='text/plain; version=0.0.4')
@@ -7,32 +7,167 @@ __email__ = "pyslvs@gmail.com"
 
 from typing import (
     cast, get_type_hints, overload, TypeVar, Tuple, List, Sequence, Dict,
-    Mapping, OrderedDict, Iterator, ItemsView, Union, Type, Any,
+    Mapping, OrderedDict, Iterable, Iterator, ItemsView, Callable, ClassVar,
+    Optional, Union, Type, IO, Any,
 )
 from abc import ABCMeta
-from dataclasses import dataclass, field, is_dataclass, asdict
-from os.path import isfile, join, relpath, dirname, sep
-from distutils.dir_util import copy_tree, mkpath
-from shutil import rmtree
-from yaml import safe_load
-from json import loads
-from jsonschema import validate
-from flask import Flask, render_template, url_for
-from .utility import is_url, valid_config, load_file, dl, rm, ROOT
+from functools import lru_cache
+from dataclasses import (
+    dataclass, field, fields, is_dataclass, asdict, MISSING,
+)
+from sys import stderr
+from os import stat, makedirs, replace
+from os.path import isfile, join, relpath, dirname, splitext, sep
+from shutil import copyfile
+from zipfile import ZipFile, ZIP_DEFLATED
+from yaml import load
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader  # type: ignore
+from json import loads, dumps
+from hashlib import sha1
+from flask import Flask, url_for, current_app
+from markupsafe import Markup
+from .utility import (
+    is_url, valid_config, load_file, fetch_all, shared_session, rm, ROOT,
+)
+from .cache import (
+    LRUCache, StaticIndex, file_stamp, file_digest, asset_cache, static_index,
+)
+from .compress import write_compressed
+from .bundle import build_bundle, bundle_folder, inline_style
+from .metrics import registry, timed, timer
 
 _Opt = Mapping[str, str]
 _Data = Dict[str, Any]
 _YamlValue = Union[bool, int, float, str, list, dict]
+_Caster = Callable[[Any], Any]
 _PROJECT = ""
+MANIFEST = ".rym-manifest.json"
+ASSET_MANIFEST = "asset-manifest.json"
+# Size of the rendered chunks in characters
+CHUNK_SIZE = 1 << 16
 T = TypeVar('T', bound=Union[_YamlValue, 'TypeChecker'])
+# Rendered <section> of the slides, shared by the server and the editor
+section_cache: LRUCache[str] = LRUCache(4096)
+registry.register_cache('section', section_cache)
+# Parsed and validated YAML files by their paths and digests
+yaml_cache: LRUCache[Any] = LRUCache(256)
+registry.register_cache('yaml', yaml_cache)
 U = TypeVar('U', bound=_YamlValue)
+S = TypeVar('S', bound=type)
+TC = TypeVar('TC', bound='TypeChecker')
+
+
+@lru_cache(maxsize=None)
+def schema_validator() -> Any:
+    """Compile the JSON schema validator once for the whole process."""
+    from jsonschema.validators import validator_for
+    schema = loads(load_file(join(ROOT, 'schema.json')))
+    validator = validator_for(schema)
+    validator.check_schema(schema)
+    return validator(schema)
+
+
+@lru_cache(maxsize=None)
+def chapter_validator() -> Any:
+    """The validator of the chapter files, a slide or a list of slides."""
+    validator = schema_validator()
+    return type(validator)({
+        '$ref': "#/definitions/hslides",
+        'definitions': validator.schema['definitions'],
+    })
+
+
+def schema_errors(config: Any, validator: Any = None) -> List[str]:
+    """Return all the schema errors of the config in one pass."""
+    return [
+        f"{'/'.join(str(p) for p in e.absolute_path) or '(root)'}: {e.message}"
+        for e in (validator or schema_validator()).iter_errors(config)
+    ]
+
+
+@timed('schema')
+def validate_config(config: _Data) -> _Data:
+    """Validate the config by the schema, report all the errors at once."""
+    errors = schema_errors(config)
+    if errors:
+        from jsonschema import ValidationError
+        raise ValidationError('\n'.join(errors))
+    return config
 
 
-def load_yaml() -> _Data:
-    """Load project."""
-    config = valid_config(safe_load(load_file(_PROJECT)))
-    validate(config, loads(load_file(join(ROOT, 'schema.json'))))
-    return config
+def parse_yaml(doc: str) -> Any:
+    """Parse the YAML document, use libyaml if available."""
+    return load(doc, Loader=_Loader)
+
+
+def load_cached(path: str, check: Callable[[Any], Any]) -> Any:
+    """Parse and check the YAML file, the result is reused until the file
+    content is changed.
+    """
+    doc = load_file(path)
+    key = (path, sha1(doc.encode('utf-8')).hexdigest())
+    return yaml_cache.get(key, lambda: check(parse_yaml(doc)))
+
+
+def load_project(project: str) -> _Data:
+    """Load and validate the project file without the chapters."""
+    return load_cached(project,
+                       lambda data: validate_config(valid_config(data)))
+
+
+def load_chapter(path: str) -> List[_Data]:
+    """Load and validate the slides of a chapter file."""
+    def check(data: Any) -> List[_Data]:
+        """Validate the slides."""
+        errors = schema_errors(data, chapter_validator())
+        if errors:
+            from jsonschema import ValidationError
+            raise ValidationError('\n'.join(f"{path}: {e}" for e in errors))
+        return data if isinstance(data, list) else [data]
+
+    return load_cached(path, check)
+
+
+def chapter_paths(project: str) -> List[str]:
+    """List the chapter files referenced by the "nav" of the project."""
+    nav = load_project(project)['nav']
+    if not isinstance(nav, list):
+        return []
+    paths = []
+    for n in nav:
+        if 'chapter' not in n:
+            continue
+        path = n['chapter']
+        if not isinstance(path, str):
+            raise TypeError(f"'chapter' expect type: {str}, "
+                            f"got: {type(path)}")
+        paths.append(path if is_url(path) else join(dirname(project), path))
+    return paths
+
+
+@timed('load_yaml')
+def load_yaml(project: str = "") -> _Data:
+    """Load project, default is the found project.
+
+    The "nav" can reference the chapter files of the slides, they are
+    merged in place. Each file is only parsed and validated again after
+    its content is changed.
+    """
+    project = project or _PROJECT
+    data = load_project(project)
+    chapters = iter(chapter_paths(project))
+    if not isinstance(data['nav'], list):
+        return dict(data)
+    nav = []
+    for n in data['nav']:
+        if 'chapter' in n:
+            nav.extend(load_chapter(next(chapters)))
+        else:
+            nav.append(n)
+    return {**data, 'nav': nav}
 
 
 @overload
@@ -47,22 +182,34 @@ def cast_to(key: str, t: Type[T], value: _YamlValue) -> T:
 
 def cast_to(key, t, value):
     """Check value type."""
-    if hasattr(t, '__origin__') and t.__origin__ is list:
+    return compile_caster(key, t)(value)
+
+
+def compile_caster(key: str, t: Any) -> _Caster:
+    """Compile the type checking function of a field."""
+    if getattr(t, '__origin__', None) is list:
         # Is listed items
         t = t.__args__[0]
         if issubclass(t, TypeChecker) and is_dataclass(t):
-            return t.as_list(value)
-        else:
-            return [cast_to(key, t, v) for v in value]
-    elif isinstance(value, t):
-        return value
-    elif (
-        issubclass(t, TypeChecker)
-        and is_dataclass(t)
-        and isinstance(value, dict)
-    ):
-        return t.from_dict(value)
-    raise TypeError(f"'{key}' expect type: {t}, got: {type(value)}")
+            return cast(Type[TypeChecker], t).as_list
+        item = compile_caster(key, t)
+        return lambda value: [item(v) for v in value]
+    if issubclass(t, TypeChecker):
+        def check_model(value: Any) -> Any:
+            if isinstance(value, t):
+                return value
+            elif is_dataclass(t) and isinstance(value, dict):
+                return cast(Type[TypeChecker], t).from_dict(value)
+            raise TypeError(f"'{key}' expect type: {t}, got: {type(value)}")
+
+        return check_model
+
+    def check(value: Any) -> Any:
+        if isinstance(value, t):
+            return value
+        raise TypeError(f"'{key}' expect type: {t}, got: {type(value)}")
+
+    return check
 
 
 def pixel(value: Union[int, str]) -> str:
@@ -73,10 +220,24 @@ def pixel(value: Union[int, str]) -> str:
 
 
 class TypeChecker(metaclass=ABCMeta):
-    """Type checker function."""
+    """Type checker function.
+
+    The type hints of the subclasses are resolved once at the class creation,
+    then the attribute assignments are checked by the compiled plan.
+    """
+    __slots__ = ()
     Self = TypeVar('Self', bound='TypeChecker')
     MaybeDict = Union[_Data, Self]
     MaybeList = Union[_Data, Sequence[_Data], Self, Sequence[Self]]
+    _plan: ClassVar[Dict[str, _Caster]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super(TypeChecker, cls).__init_subclass__(**kwargs)
+        cls._plan = {
+            key: compile_caster(key, t)
+            for key, t in get_type_hints(cls).items()
+            if getattr(t, '__origin__', None) is not ClassVar
+        }
 
     @classmethod
     def from_dict(cls: Type[Self], data: MaybeDict) -> Self:
@@ -99,10 +260,83 @@ class TypeChecker(metaclass=ABCMeta):
         return [cls.from_dict(d) for d in data]
 
     def __setattr__(self, key, value):
-        super(TypeChecker, self).__setattr__(key, cast_to(
-            key, get_type_hints(self.__class__).get(key, None), value))
+        try:
+            check = self._plan[key]
+        except KeyError:
+            raise TypeError(
+                f"'{key}' is not a field of {type(self)}") from None
+        super(TypeChecker, self).__setattr__(key, check(value))
+
+
+def slotted(cls: S) -> S:
+    """Recreate the data class with the slots of its fields, so its instances
+    have no "__dict__".
+    """
+    inherited = {name for base in cls.__mro__[1:]
+                 for name in getattr(base, '__slots__', ())}
+    names = []
+    for f in fields(cls):
+        if not f.init and f.default is not MISSING:
+            raise TypeError(f"'{f.name}' should use a default factory")
+        names.append(f.name)
+    ns = dict(cls.__dict__)
+    for name in names + ['__dict__', '__weakref__']:
+        ns.pop(name, None)
+    ns['__slots__'] = tuple(name for name in names if name not in inherited)
+    return type(cls)(cls.__name__, cls.__bases__, ns)
+
+
+# The shared default values by their names
+_shared: Dict[str, Any] = {}
+
+
+def shared_value(name: str) -> Any:
+    """Return the shared default value of the name."""
+    return _shared[name]
+
+
+class _Shared:
+    """Methods of the read-only shared values.
+
+    The copies are the value itself, and the pickled value is resolved to
+    the shared one of the process.
+    """
+    __slots__ = ()
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        raise AttributeError(f"'{key}' of the shared {type(self).__name__} "
+                             f"is read-only")
+
+    def __copy__(self) -> Any:
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Any:
+        return self
+
+    def __reduce__(self) -> Tuple[Callable[[str], Any], Tuple[str]]:
+        for name, value in _shared.items():
+            if value is self:
+                return shared_value, (name,)
+        raise TypeError(f"unregistered shared {type(self).__name__}")
 
 
+@lru_cache(maxsize=None)
+def _shared_type(cls: Type[TypeChecker]) -> Type[TypeChecker]:
+    """Return the read-only subclass."""
+    return cast(Type[TypeChecker], ABCMeta(cls.__name__, (_Shared, cls), {
+        '__slots__': (), '__module__': cls.__module__}))
+
+
+def shared(name: str, value: TC) -> TC:
+    """Make the value read-only, then it can be shared as a default value
+    instead of allocated for every instance.
+    """
+    object.__setattr__(value, '__class__', _shared_type(type(value)))
+    _shared[name] = value
+    return value
+
+
+@slotted
 @dataclass(repr=False, eq=False)
 class Size(TypeChecker):
     """The block has size attributes."""
@@ -115,18 +349,21 @@ class Size(TypeChecker):
         self.height = pixel(self.height)
 
 
+@slotted
 @dataclass(repr=False, eq=False)
 class Img(Size):
     """Image class."""
     label: str = ""
 
 
+@slotted
 @dataclass(repr=False, eq=False)
 class Footer(Img):
     """Footer class."""
     link: str = ""
 
 
+@slotted
 @dataclass(repr=False, eq=False)
 class Fragment(TypeChecker):
     """Fragment option."""
@@ -136,6 +373,13 @@ class Fragment(TypeChecker):
     embed: str = ""
 
 
+# The default blocks of the slides, they are shared
+_SIZE = shared('size', Size())
+_EMBED = shared('embed', Size(width='1000px', height='450px'))
+_FRAGMENT = shared('fragment', Fragment())
+
+
+@slotted
 @dataclass(repr=False, eq=False)
 class Slide(TypeChecker):
     """Slide class."""
@@ -145,11 +389,14 @@ class Slide(TypeChecker):
     include: str = ""
     math: str = ""
     img: List[Img] = field(default_factory=list)
-    youtube: Size = field(default_factory=Size)
-    embed: Size = field(default_factory=Size)
-    fragment: Fragment = field(default_factory=Fragment)
+    youtube: Size = _SIZE
+    embed: Size = _SIZE
+    fragment: Fragment = _FRAGMENT
 
     def __post_init__(self):
+        if self.embed is _SIZE:
+            self.embed = _EMBED
+            return
         if not self.embed.width:
             self.embed.width = '1000px'
         if not self.embed.height:
@@ -163,19 +410,22 @@ class Slide(TypeChecker):
                                          self.embed.src))
 
 
+@slotted
 @dataclass(repr=False, eq=False)
 class HSlide(Slide):
     """Root slide class."""
     sub: List[Slide] = field(default_factory=list)
 
 
+@slotted
 @dataclass(repr=False, eq=False)
 class Plugin(TypeChecker):
     """Plugin enable / disable options."""
     zoom: bool = False
     notes: bool = True
     search: bool = False
-    markdown: bool = field(default=True, init=False)
+    # The slots have no class defaults for the fields not in "__init__"
+    markdown: bool = field(default_factory=lambda: True, init=False)
     highlight: bool = True
     math: bool = False
 
@@ -183,7 +433,13 @@ class Plugin(TypeChecker):
         """Return self as mapping."""
         return asdict(self, dict_factory=OrderedDict[str, bool]).items()
 
+    def enabled(self) -> List[str]:
+        """Return the enabled plugins in the import order."""
+        return [name for name, enabled in self.as_dict() if enabled]
+
 
+@timed('config')
+@slotted
 @dataclass(repr=False, eq=False)
 class Config(TypeChecker):
     """Config overview."""
@@ -210,6 +466,7 @@ class Config(TypeChecker):
     mouse_wheel: bool = False
     preview_links: bool = False
     transition: str = "slide"
+    lazy_load: int = 0
     footer: Footer = field(default_factory=Footer)
     nav: List[HSlide] = field(default_factory=list)
     plugin: Plugin = field(default_factory=Plugin)
@@ -223,6 +480,9 @@ class Config(TypeChecker):
         if self.outline not in {0, 1, 2}:
             raise ValueError(f"outline level should be 0, 1 or 2, "
                              f"not {self.outline}")
+        if self.lazy_load < 0:
+            raise ValueError(f"lazy load distance should not be negative, "
+                             f"not {self.lazy_load}")
         # Make an outline page
         doc = []
         for i, j, n in self.slides:
@@ -247,16 +507,77 @@ class Config(TypeChecker):
                 yield i, j + 1, sn
 
 
-def render_slides(config: Config, *, rel_url: bool = False) -> str:
-    """Rendered slides."""
-    if rel_url:
+def slide_content(n: Slide) -> List[Any]:
+    """Return the content of a slide as built-in types, without sub-slides."""
+    content = []
+    for f in fields(Slide):
+        v: Any = getattr(n, f.name)
+        if isinstance(v, list):
+            v = [asdict(img) for img in v]
+        elif not isinstance(v, str):
+            v = asdict(v)
+        content.append(v)
+    return content
+
+
+def source_path(config: Config, local_files: StaticIndex, path: str) -> str:
+    """Return the local path or the URL of the included file, the missing
+    local files are loaded from the CDN.
+    """
+    if not path or is_url(path):
+        return path
+    if config.cdn and path not in local_files:
+        return f"{config.cdn}/{path}"
+    return join(local_files.path, path)
+
+
+def buffered(chunks: Iterable[str], size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Join the small chunks until reach the size."""
+    buf: List[str] = []
+    n = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        n += len(chunk)
+        if n >= size:
+            yield "".join(buf)
+            buf.clear()
+            n = 0
+    if buf:
+        yield "".join(buf)
+
+
+def stream_slides(
+    config: Config,
+    *,
+    rel_url: bool = False,
+    live_reload: str = "",
+    project: str = "",
+    static_url: Optional[Callable[..., str]] = None,
+    bundle: bool = False
+) -> Iterator[str]:
+    """Render the slides by chunks, the sections are rendered when the
+    chunks are taken, so the whole page is never held in memory.
+
+    The includes are fetched and the bundle is built before returned, the
+    errors of a slide are raised when its chunk is taken.
+
+    The "live_reload" is the URL of the reload events. The "project" is the
+    YAML path, default is the found project, and the "static_url" replaces
+    the URL function of the static files. If "bundle" is enabled, the
+    scripts are loaded from a bundle, and the small stylesheets are inlined.
+    """
+    if static_url is not None:
+        url_func = static_url
+    elif rel_url:
         def url_func(endpoint: str, *, filename: str) -> str:
             """Generate relative internal path."""
             path = join(ROOT, endpoint, filename).replace('/', sep)
             return relpath(path, ROOT).replace(sep, '/')
     else:
         url_func = url_for
-    project_dir = dirname(_PROJECT)
+    project_dir = dirname(project or _PROJECT)
+    static_dir = join(project_dir, 'static')
+    local_files = static_index(static_dir)
 
     def uri(path: str) -> str:
         """Handle the relative path and URIs."""
@@ -269,64 +590,351 @@ def render_slides(config: Config, *, rel_url: bool = False) -> str:
             and config.cdn
             # Prefer to load local files
             # Check files when reloading
-            and not isfile(join(project_dir, 'static', path))
+            and path not in local_files
         ):
             return f"{config.cdn}/{path}"
         return url_func('static', filename=path)
 
-    def include(path: str) -> str:
-        """Include text file."""
-        return load_file(join(project_dir, uri(path).strip('/')))
+    def include_path(path: str) -> str:
+        """Return the local path or the URL of the included file."""
+        return source_path(config, local_files, path)
 
-    return render_template("slides.html", config=config, url_for=url_func,
-                           uri=uri, include=include)
+    # Resolve the remote includes concurrently before rendering
+    _, errors = fetch_all(
+        (path for path in map(include_path, [config.extra_style] + [
+            n.include for _, _, n in config.slides]) if is_url(path)),
+        retries=0, session=shared_session(), stale=True, prune=False)
 
-
-def find_project(flask_app: Flask, pwd: str) -> str:
-    """Get project name from the current path."""
+    def include(path: str) -> str:
+        """Include text file."""
+        path = include_path(path)
+        if path in errors:
+            raise errors[path]
+        return load_file(path, stale=True)
+
+    def include_stamp(path: str) -> Any:
+        """Return the version of the included file."""
+        path = include_path(path)
+        if is_url(path):
+            meta = asset_cache().lookup(path)
+            return None if meta is None else meta['blob']
+        return file_stamp(path)
+
+    def inline(path: str) -> str:
+        """Return the stylesheet content if it can be inlined."""
+        return inline_style(static_dir, path) if bundle else ""
+
+    template = current_app.jinja_env.get_template("section.html")
+
+    def section(n: Slide) -> Markup:
+        """Render a slide, reuse the cached one if its content is unchanged.
+
+        The key contains the resolved URIs and the deck-level options
+        that the slide depends on.
+        """
+        key = repr((
+            slide_content(n),
+            [uri(img.src) for img in n.img],
+            uri(n.embed.src),
+            uri(n.youtube.src),
+            uri(config.watermark),
+            config.watermark_size,
+            config.lazy_load,
+            include_stamp(n.include) if n.include else None,
+        ))
+        return Markup(section_cache.get(
+            sha1(key.encode('utf-8')).hexdigest(),
+            lambda: template.render(config=config, url_for=url_func, uri=uri,
+                                    include=include, n=n)))
+
+    context = dict(config=config, url_for=url_func, uri=uri,
+                   include=include, section=section, inline_style=inline,
+                   live_reload=live_reload,
+                   bundle=build_bundle(static_dir, config.plugin.enabled())
+                   if bundle else "")
+    current_app.update_template_context(context)
+    chunks = buffered(current_app.jinja_env.get_template("slides.html")
+                      .generate(context))
+
+    def timed_chunks() -> Iterator[str]:
+        """Record the rendering when the chunks are taken."""
+        with timer('render_slides'):
+            yield from chunks
+
+    return timed_chunks()
+
+
+def render_slides(
+    config: Config,
+    *,
+    rel_url: bool = False,
+    live_reload: str = "",
+    project: str = "",
+    static_url: Optional[Callable[..., str]] = None,
+    bundle: bool = False
+) -> str:
+    """Rendered slides, see "stream_slides" for the options."""
+    return "".join(stream_slides(config, rel_url=rel_url,
+                                 live_reload=live_reload, project=project,
+                                 static_url=static_url, bundle=bundle))
+
+
+def render_files(config: Config, project: str = "") -> List[str]:
+    """List the files that the rendered slides depend on, the remote files
+    are listed by their URLs.
+
+    They are the included files and the directories of the static folder,
+    since adding or removing a static file decides whether it is loaded
+    locally or from the CDN.
+    """
+    local_files = static_index(join(dirname(project or _PROJECT), 'static'))
+    includes = [n.include for _, _, n in config.slides]
+    return [source_path(config, local_files, path)
+            for path in [config.extra_style] + includes
+            if path] + list(local_files.dirs)
+
+
+def project_files(config: Config, project: str = "") -> List[str]:
+    """List the source files of the project, the remote files are listed
+    by their URLs.
+    """
+    project = project or _PROJECT
+    return ([project] + chapter_paths(project)
+            + render_files(config, project))
+
+
+def project_yaml(pwd: str) -> str:
+    """Return the YAML path of the project folder, or empty if not found."""
     project = join(pwd, "reveal.yaml")
     if not isfile(project):
         project = join(pwd, "reveal.yml")
     if not isfile(project):
         return ""
+    return project
+
+
+def find_project(flask_app: Flask, pwd: str) -> str:
+    """Get project name from the current path."""
+    project = project_yaml(pwd)
+    if not project:
+        return ""
     flask_app.config['STATIC_FOLDER'] = join(pwd, 'static')
     global _PROJECT
     _PROJECT = project
     return _PROJECT
 
 
-def pack(root: str, build_path: str, app: Flask) -> None:
-    """Pack into a static project."""
-    with app.app_context():
-        copy_project(Config(**load_yaml()), root, build_path)
-
-
-def copy_project(config: Config, root: str, build_path: str) -> None:
-    """Copy project."""
-    mkpath(build_path)
-    copy_tree(join(root, 'static'), join(build_path, 'static'))
+def pack(root: str, build_path: str, app: Flask, *, jobs: int = 8,
+         fingerprint: bool = False, bundle: bool = False,
+         prune: bool = True) -> None:
+    """Pack into a static project.
 
-    # Download from CDN
-    def cdn(src: str) -> None:
-        """Download from source path."""
-        if src and not is_url(src):
-            dl(f"{config.cdn}/{src}", join(build_path, 'static', src))
-
-    cdn(config.icon)
-    cdn(config.watermark)
+    The project of the root folder is used, or the found project if not
+    exist. The asset cache is pruned after downloaded if "prune" is enabled.
+    """
+    project = project_yaml(root) or _PROJECT
+    with app.app_context():
+        copy_project(Config(**load_yaml(project)), root, build_path,
+                     jobs=jobs, fingerprint=fingerprint, bundle=bundle,
+                     project=project, prune=prune)
+
+
+def plan_project(config: Config, root: str) -> Dict[str, str]:
+    """Plan the static files of the output, map the output path to its source.
+
+    The editor, disabled plugins and included files are not planned.
+    """
+    static_dir = join(root, 'static')
+    excluded = {'ace'}
+    excluded.update(f"plugin/{name}"
+                    for name, enabled in config.plugin.as_dict()
+                    if not enabled)
+    excluded.add(config.extra_style)
+    excluded.update(n.include for _, _, n in config.slides)
+    plan = {}
+    for rel in static_index(static_dir).files:
+        parts = rel.split('/')
+        if any('/'.join(parts[:i]) in excluded
+               for i in range(1, len(parts) + 1)):
+            continue
+        plan[f"static/{rel}"] = join(static_dir, *parts)
+    return plan
+
+
+def gather_project(config: Config, root: str, *, jobs: int = 8,
+                   prune: bool = True) -> Dict[str, str]:
+    """Plan the static files, and fetch the missing sources from the CDN
+    into the asset cache.
+
+    Return the sources of the output paths.
+    """
+    plan = plan_project(config, root)
+    srcs = [config.icon, config.watermark]
     for _, _, n in config.slides:
-        for img in n.img:
-            cdn(img.src)
-        cdn(n.embed.src)
+        srcs.extend(img.src for img in n.img)
+        srcs.append(n.embed.src)
+    downloads = {f"static/{src}": f"{config.cdn}/{src}" for src in srcs
+                 if src and not is_url(src) and f"static/{src}" not in plan}
+    blobs, errors = fetch_all(downloads.values(), jobs=jobs, prune=prune)
+    for url, e in errors.items():
+        stderr.write(f"warning: failed to download {url}: {e}\n")
+    plan.update((rel, blobs[url]) for rel, url in downloads.items()
+                if url in blobs)
+    return plan
+
+
+def copy_project(config: Config, root: str, build_path: str, *,
+                 jobs: int = 8, fingerprint: bool = False,
+                 bundle: bool = False, project: str = "",
+                 prune: bool = True) -> None:
+    """Copy project.
+
+    The output is recorded in a manifest. Packing into the same path again
+    only rewrites the changed files, and removes the files that are no
+    longer needed.
+
+    If "fingerprint" is enabled, the files referenced by index.html are
+    renamed with their content hashes, and are written with the compressed
+    siblings and an asset manifest, so they can be cached as immutable.
+    If "bundle" is enabled, the scripts are packed into a bundle.
+    The "project" is the YAML path, default is the found project.
+    """
+    manifest_path = join(build_path, MANIFEST)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            old = loads(f.read())
+    except (OSError, ValueError):
+        old = {}
+    makedirs(build_path, exist_ok=True)
+    new = {}
+    files = gather_project(config, root, jobs=jobs, prune=prune)
+    if bundle:
+        name = build_bundle(join(root, 'static'), config.plugin.enabled())
+        files[f"bundle/{name}"] = join(bundle_folder(), name)
+    for rel, src in files.items():
+        st = stat(src)
+        dst = join(build_path, rel)
+        entry = old.get(rel, {})
+        if (
+            entry.get('src') == src
+            and entry.get('mtime') == st.st_mtime_ns
+            and entry.get('size') == st.st_size
+            and isfile(dst)
+        ):
+            new[rel] = entry
+            continue
+        digest = file_digest(src)
+        if entry.get('sha1') != digest or not isfile(dst):
+            makedirs(dirname(dst), exist_ok=True)
+            copyfile(src, dst)
+        new[rel] = {'src': src, 'mtime': st.st_mtime_ns, 'size': st.st_size,
+                    'sha1': digest}
     # Render index.html
-    with open(join(build_path, "index.html"), 'w+', encoding='utf-8') as f:
-        f.write(render_slides(config, rel_url=True))
-    # Remove include files
-    rm(join(build_path, 'static', config.extra_style))
-    for _, _, n in config.slides:
-        rm(join(build_path, 'static', n.include))
-    # Remove unused js module
-    rmtree(join(build_path, 'static', 'ace'), ignore_errors=True)
-    for name, enabled in config.plugin.as_dict():
-        if not enabled:
-            rmtree(join(build_path, 'static', 'plugin', name))
+    assets: Dict[str, str] = {}
+    static_url: Optional[Callable[..., str]] = None
+    if fingerprint:
+        def fingerprinted(endpoint: str, *, filename: str) -> str:
+            """Map the static file to its fingerprinted name."""
+            rel = f"{endpoint}/{filename}"
+            if 'sha1' not in new.get(rel, {}):
+                return rel
+            if rel not in assets:
+                stem, ext = splitext(rel)
+                assets[rel] = f"{stem}.{new[rel]['sha1'][:10]}{ext}"
+            return assets[rel]
+
+        static_url = fingerprinted
+
+    def write(rel: str, chunks: Iterable[str]) -> bool:
+        """Write the chunks through a temporary file, keep the old file if
+        unchanged. Return true if written.
+        """
+        path = join(build_path, rel)
+        h = sha1()
+        try:
+            with open(path + '.part', 'wb') as f:
+                for chunk in chunks:
+                    data = chunk.encode('utf-8')
+                    h.update(data)
+                    f.write(data)
+        except BaseException:
+            rm(path + '.part')
+            raise
+        digest = h.hexdigest()
+        new[rel] = {'sha1': digest}
+        if old.get(rel, {}).get('sha1') == digest and isfile(path):
+            rm(path + '.part')
+            return False
+        replace(path + '.part', path)
+        return True
+
+    changed = {"index.html": write("index.html", stream_slides(
+        config, rel_url=True, project=project, static_url=static_url,
+        bundle=bundle))}
+    if fingerprint:
+        for rel, fp in assets.items():
+            if not isfile(join(build_path, fp)):
+                copyfile(join(build_path, rel), join(build_path, fp))
+            new[fp] = {'sha1': new[rel]['sha1']}
+            changed[fp] = False
+        changed[ASSET_MANIFEST] = write(ASSET_MANIFEST, [dumps(
+            assets, indent=1, sort_keys=True)])
+        for rel, force in changed.items():
+            for path in write_compressed(join(build_path, rel), force=force):
+                new[relpath(path, build_path).replace(sep, '/')] = {'of': rel}
+    # Remove the outdated files
+    for rel in old.keys() - new.keys():
+        rm(join(build_path, rel))
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        f.write(dumps(new, indent=1, sort_keys=True))
+
+
+class _ZipSink:
+    """A non-seekable buffer, the zip archive is written in data descriptor
+    mode and taken out by chunks.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+
+    def write(self, b: bytes) -> int:
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        """Take out the written data."""
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def zip_project(config: Config, root: str, *,
+                jobs: int = 8) -> Iterator[bytes]:
+    """Generate the zip archive of the packed project in chunks.
+
+    The archive is built from the source files and the rendered HTML
+    directly, the includes and the assets are fetched before the first
+    chunk, and the slides are rendered while archived.
+    """
+    html = stream_slides(config, rel_url=True)
+    files = gather_project(config, root, jobs=jobs)
+
+    def archive() -> Iterator[bytes]:
+        sink = _ZipSink()
+        with ZipFile(cast(IO[bytes], sink), 'w', ZIP_DEFLATED) as z:
+            with z.open("index.html", 'w') as dst:
+                for chunk in html:
+                    dst.write(chunk.encode('utf-8'))
+                    yield sink.pop()
+            yield sink.pop()
+            for rel, src in sorted(files.items()):
+                with open(src, 'rb') as f, z.open(rel, 'w') as dst:
+                    for chunk in iter(lambda: f.read(1 << 16), b""):
+                        dst.write(chunk)
+                        yield sink.pop()
+        yield sink.pop()
+
+    return archive()
@@ -5,34 +5,209 @@ __copyright__ = "Copyright (C) 2019-2020"
 __license__ = "MIT"
 __email__ = "pyslvs@gmail.com"
 
-from flask import Flask, send_from_directory
+from typing import Tuple, List, Iterator
+from itertools import chain
+from os import scandir
+from os.path import join, dirname
+from flask import Flask, Response, make_response, request, url_for, abort
 from werkzeug.exceptions import HTTPException
-from .slides import render_slides, load_yaml, Config, HSlide
+from .slides import (
+    render_slides, stream_slides, load_yaml, project_files, project_yaml,
+    chapter_paths, Config, HSlide,
+)
+from .cache import DeckCache, LRUCache, static_index
+from .utility import is_url, ROOT
+from .compress import send_compressed
+from .bundle import bundle_folder
+from .metrics import registry, instrument
+from .watch import Broadcaster, Watcher, walk_files
 
 app = Flask(__name__)
+app.send_static_file = lambda filename: send_compressed(  # type: ignore
+    app.static_folder or "", filename)
+deck = DeckCache()
+events = Broadcaster()
+
+
+class Project:
+    """A project hosted under its folder name, with its own compiled deck."""
+
+    def __init__(self, name: str, path: str) -> None:
+        self.name = name
+        self.path = path
+        self.static_folder = join(dirname(path), 'static')
+        self.deck = DeckCache()
+
+    def static_url(self, endpoint: str, *, filename: str) -> str:
+        """URL function of the static files."""
+        if endpoint != 'static':
+            return url_for(endpoint, filename=filename)
+        return url_for('project_static', name=self.name, filename=filename)
+
+    def compile(self) -> Tuple[Iterator[str], List[str]]:
+        """Compile the project, return the HTML chunks and the source files."""
+        config = Config(**load_yaml(self.path))
+        return (stream_slides(config, project=self.path,
+                              static_url=self.static_url,
+                              bundle=app.config.get('BUNDLE', False)),
+                project_files(config, self.path))
+
+
+# Hosted projects, the least recently used ones are unloaded
+projects: LRUCache[Project] = LRUCache(32)
+registry.register_cache('project', projects)
+instrument(app)
+
+
+def host_projects(root: str, capacity: int = 32) -> None:
+    """Serve the project folders under the root folder by their names.
+
+    At most "capacity" projects are kept in memory.
+    """
+    app.config['PROJECT_ROOT'] = root
+    app.config['STATIC_FOLDER'] = join(ROOT, 'static')
+    projects.capacity = capacity
+    projects.clear()
+
+
+def get_project(name: str) -> Project:
+    """Return the hosted project, or abort with 404."""
+    root = app.config.get('PROJECT_ROOT')
+    if not root or name.startswith('.'):
+        abort(404)
+    project = projects.get(name, lambda: Project(name, project_yaml(
+        join(root, name)) or abort(404)))
+    if not project_yaml(dirname(project.path)):
+        # The project is removed
+        projects.discard(name)
+        abort(404)
+    return project
+
+
+def compile_deck() -> Tuple[Iterator[str], List[str]]:
+    """Compile the project, return the HTML chunks and its source files."""
+    config = Config(**load_yaml())
+    live_reload = url_for('event_stream') if app.config.get('WATCH') else ""
+    return (stream_slides(config, live_reload=live_reload,
+                          bundle=app.config.get('BUNDLE', False)),
+            project_files(config))
+
+
+def watch(interval: float = 0.5) -> Watcher:
+    """Recompile the project in the background when its files are changed,
+    then push a reload event to the browsers.
+    """
+    app.config['WATCH'] = True
+    index = static_index(app.config['STATIC_FOLDER'])
+    index.watched = True
+
+    def files() -> Iterator[str]:
+        """The project file and its chapters, the source files of the last
+        compilation and the static files.
+
+        The project file is always watched, so a failed compilation is
+        recompiled after fixed.
+        """
+        project = project_yaml(dirname(app.config['STATIC_FOLDER']))
+        try:
+            chapters = [path for path in chapter_paths(project)
+                        if not is_url(path)]
+        except Exception:
+            # Watch the project file until it is fixed
+            chapters = []
+        return chain([project] if project else [], chapters,
+                     (path for path, _ in deck.stamps),
+                     walk_files(app.config['STATIC_FOLDER']))
+
+    def reload() -> None:
+        """Compile before the browsers reload."""
+        deck.clear()
+        index.invalidate()
+        with app.test_request_context():
+            try:
+                deck.get(compile_deck)
+            except Exception:
+                # Let the browsers request the error page
+                pass
+        events.publish('reload')
+
+    reload()
+    watcher = Watcher(files, reload, interval)
+    watcher.start()
+    return watcher
+
+
+def deck_response(chunks: Tuple[bytes, ...], etag: str) -> Response:
+    """Response of the compiled deck, the chunks are sent in turn."""
+    response = Response(chunks, mimetype='text/html')
+    response.set_etag(etag)
+    # Always revalidate with the ETag
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+    return response
 
 
 @app.route('/')
-def index() -> str:
-    """Generate the presentation."""
-    return render_slides(Config(**load_yaml()))
+def index() -> Response:
+    """Generate the presentation, or the list of the hosted projects."""
+    root = app.config.get('PROJECT_ROOT')
+    if root:
+        with scandir(root) as it:
+            names = sorted(e.name for e in it if e.is_dir()
+                           and not e.name.startswith('.')
+                           and project_yaml(e.path))
+        return make_response(render_slides(Config(
+            title="Projects", outline=0, nav=[HSlide(
+                title="Projects",
+                doc='\n'.join(f"+ [{name}]({name}/)" for name in names)
+            )])))
+    return deck_response(*deck.get(compile_deck))
+
+
+@app.route('/<name>/')
+def project_index(name: str) -> Response:
+    """Generate the presentation of a hosted project."""
+    project = get_project(name)
+    return deck_response(*project.deck.get(project.compile))
+
+
+@app.route('/<name>/static/<path:filename>')
+def project_static(name: str, filename: str) -> Response:
+    """Static files of a hosted project."""
+    return send_compressed(get_project(name).static_folder, filename)
+
+
+@app.route('/events')
+def event_stream() -> Response:
+    """Server-Sent Events of the live reload, only in the watch mode."""
+    if not app.config.get('WATCH'):
+        abort(404)
+    return Response(events.subscribe(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/bundle/<filename>')
+def bundle(filename: str) -> Response:
+    """Script bundles, they are named by their contents."""
+    return send_compressed(bundle_folder(), filename, vendor=True)
 
 
 @app.route('/static/<path:folder>/<path>', methods=['GET'])
 def send_static(folder: str, path: str):
     """PNG route from static folder."""
-    return send_from_directory(app.config['STATIC_FOLDER'] + '/' + folder, path)
+    return send_compressed(app.config['STATIC_FOLDER'], f"{folder}/{path}")
 
 
 @app.errorhandler(403)
 @app.errorhandler(410)
 @app.errorhandler(500)
-def server_error(e: HTTPException) -> str:
-    """Error pages."""
+def server_error(e: HTTPException) -> Tuple[str, int]:
+    """Error pages, they are reloaded in the watch mode."""
     from traceback import format_exc
     title = f"{e.code} {e.name}"
+    live_reload = url_for('event_stream') if app.config.get('WATCH') else ""
     return render_slides(
         Config(title=title, theme='night', nav=[HSlide(
             title=title,
             doc=f"```sh\n{format_exc()}\n{e.description}\n```"
-        )]))
+        )]), live_reload=live_reload), e.code or 500
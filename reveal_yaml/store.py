@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Tuple, Dict, Optional, Any
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from os import environ, makedirs
+from os.path import join
+from threading import Lock, local
+from time import time
+from json import dumps, loads
+import sqlite3
+from .cache import cache_dir
+from .metrics import timed
+
+_Data = Dict[str, Any]
+
+
+class PreviewStore(metaclass=ABCMeta):
+    """Storage of the posted configs of the editor previews.
+
+    The oldest configs are evicted when the capacity is exceeded, and the
+    configs are expired after the TTL in seconds.
+    """
+
+    def __init__(self, capacity: int, ttl: float) -> None:
+        self.capacity = capacity
+        self.ttl = ttl
+
+    @abstractmethod
+    def put(self, key: int, data: _Data) -> None:
+        """Store the config."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, key: int) -> Optional[_Data]:
+        """Return the config, or None if not found or expired."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryStore(PreviewStore):
+    """In-process LRU store, the insertion and eviction are O(1).
+
+    The configs are not shared between the worker processes.
+    """
+
+    def __init__(self, capacity: int, ttl: float) -> None:
+        super(MemoryStore, self).__init__(capacity, ttl)
+        self.lock = Lock()
+        self.data: OrderedDict[int, Tuple[float, _Data]] = OrderedDict()
+
+    @timed('store_put')
+    def put(self, key: int, data: _Data) -> None:
+        """Store the config."""
+        with self.lock:
+            self.data[key] = (time() + self.ttl, data)
+            self.data.move_to_end(key)
+            while len(self.data) > self.capacity:
+                self.data.popitem(last=False)
+
+    @timed('store_get')
+    def get(self, key: int) -> Optional[_Data]:
+        """Return the config, or None if not found or expired."""
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            if item[0] < time():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return item[1]
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+class SQLiteStore(PreviewStore):
+    """SQLite store in WAL mode, can be shared by the worker processes.
+
+    The creation time is indexed, and the old rows are evicted in batches.
+    """
+
+    def __init__(self, path: str, capacity: int, ttl: float) -> None:
+        super(SQLiteStore, self).__init__(capacity, ttl)
+        self.path = path
+        self.local = local()
+        self.lock = Lock()
+        self.inserted = 0
+        # Evict after inserted a tenth of the capacity
+        self.batch = max(1, capacity // 10)
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """The connection of the current thread, created at first use."""
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30,
+                                 isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS preview ("
+                       "id INTEGER PRIMARY KEY, "
+                       "created REAL NOT NULL, "
+                       "json TEXT NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS preview_created "
+                       "ON preview (created)")
+            self.local.db = db
+        return db
+
+    @timed('store_put')
+    def put(self, key: int, data: _Data) -> None:
+        """Store the config."""
+        self.db.execute("INSERT OR REPLACE INTO preview VALUES (?, ?, ?)",
+                        (key, time(), dumps(data)))
+        with self.lock:
+            self.inserted += 1
+            if self.inserted < self.batch:
+                return
+            self.inserted = 0
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove the expired rows and the rows over the capacity."""
+        self.db.execute(
+            "DELETE FROM preview WHERE created < ? OR id IN ("
+            "SELECT id FROM preview ORDER BY created DESC "
+            "LIMIT -1 OFFSET ?)", (time() - self.ttl, self.capacity))
+
+    @timed('store_get')
+    def get(self, key: int) -> Optional[_Data]:
+        """Return the config, or None if not found or expired."""
+        row = self.db.execute(
+            "SELECT json FROM preview WHERE id = ? AND created >= ?",
+            (key, time() - self.ttl)).fetchone()
+        return None if row is None else loads(row[0])
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM preview").fetchone()[0]
+
+
+def preview_store() -> PreviewStore:
+    """Create the preview store from the environment variables.
+
+    + RYM_PREVIEW_STORE: "sqlite" (default) or "memory".
+    + RYM_PREVIEW_DB: path of the SQLite database, default is in the cache
+      folder of the user.
+    + RYM_PREVIEW_CAPACITY: number of the configs, default is 300.
+    + RYM_PREVIEW_TTL: lifetime in seconds, default is an hour.
+    """
+    capacity = int(environ.get('RYM_PREVIEW_CAPACITY', 300))
+    ttl = float(environ.get('RYM_PREVIEW_TTL', 60 * 60))
+    kind = environ.get('RYM_PREVIEW_STORE', 'sqlite')
+    if kind == 'memory':
+        return MemoryStore(capacity, ttl)
+    elif kind == 'sqlite':
+        path = environ.get('RYM_PREVIEW_DB')
+        if not path:
+            folder = cache_dir()
+            makedirs(folder, exist_ok=True)
+            path = join(folder, 'preview.db')
+        return SQLiteStore(path, capacity, ttl)
+    raise ValueError(f"unknown preview store: {kind}")
@@ -7,17 +7,24 @@ __copyright__ = "Copyright (C) 2019-2020"
 __license__ = "MIT"
 __email__ = "pyslvs@gmail.com"
 
-from typing import Dict, Any, TYPE_CHECKING
-from os import remove, getcwd
+from typing import Tuple, Dict, Iterable, Optional, Any, TYPE_CHECKING
+from sys import stderr
+from os import remove, makedirs, getcwd
 from os.path import isfile, join, abspath, dirname
+from time import sleep
+from functools import lru_cache
 from urllib.parse import urlparse
-from requests import get
+from shutil import copyfile
+from .cache import asset_cache
+from .metrics import timed
 
 if TYPE_CHECKING:
+    from requests import Session
     from flask import Flask
 
 ROOT = abspath(dirname(__file__))
 PWD = abspath(getcwd())
+TIMEOUT = 30.
 
 
 def is_url(path: str) -> bool:
@@ -26,10 +33,39 @@ def is_url(path: str) -> bool:
     return all((u.scheme, u.netloc, u.path))
 
 
-def serve(pwd: str, app: Flask, ip: str, port: int = 0) -> None:
-    """Serve the app."""
+def serve(pwd: str, app: Flask, ip: str, port: int = 0, *,
+          workers: int = 0) -> None:
+    """Serve the app.
+
+    Use the development server by default, or a WSGI server with the
+    number of worker processes.
+    """
     key = (join(pwd, 'localhost.crt'), join(pwd, 'localhost.key'))
-    if isfile(key[0]) and isfile(key[1]):
+    tls = isfile(key[0]) and isfile(key[1])
+    if workers > 0:
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            stderr.write("warning: gunicorn is not available, "
+                         "use the development server\n")
+        else:
+            class Server(BaseApplication):
+                def load_config(self) -> None:
+                    self.cfg.set('bind', f"{ip}:{port}")
+                    self.cfg.set('workers', workers)
+                    # Threaded workers for the event streams
+                    self.cfg.set('worker_class', 'gthread')
+                    self.cfg.set('threads', 4)
+                    if tls:
+                        self.cfg.set('certfile', key[0])
+                        self.cfg.set('keyfile', key[1])
+
+                def load(self) -> Flask:
+                    return app
+
+            Server().run()
+            return
+    if tls:
         from ssl import SSLContext, PROTOCOL_TLSv1_2
         context = SSLContext(PROTOCOL_TLSv1_2)
         context.load_cert_chain(key[0], key[1])
@@ -45,22 +81,119 @@ def valid_config(data: Dict[str, Any]) -> Dict[str, Any]:
     return data
 
 
-def load_file(path: str) -> str:
-    """Load file from the path."""
+@timed('load_file')
+def load_file(path: str, *, stale: bool = False) -> str:
+    """Load file from the path.
+
+    The URLs are read through the asset cache, allow the stale entries to
+    be used while revalidating if "stale" is enabled.
+    """
     if is_url(path):
-        return get(path).text
+        cache = asset_cache()
+        meta = cache.fetch(path, session=shared_session(), stale=stale)
+        with open(cache.blob_path(meta), 'r', encoding=meta['encoding'],
+                  errors='replace') as f:
+            return f.read()
     if not path or not isfile(path):
         return ""
     with open(path, 'r', encoding='utf-8') as f:
         return f.read()
 
 
-def dl(url: str, dist: str) -> None:
-    """Download file if not exist."""
+def pooled_session(pool_size: int) -> Session:
+    """Create a keep-alive session with a connection pool of the size."""
+    from requests import Session
+    from requests.adapters import HTTPAdapter
+    s = Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    s.mount('http://', adapter)
+    s.mount('https://', adapter)
+    return s
+
+
+@lru_cache(maxsize=None)
+def shared_session() -> Session:
+    """The keep-alive session shared by the renders of the process."""
+    return pooled_session(8)
+
+
+@timed('dl')
+def dl(url: str, dist: str, *, session: Optional[Session] = None,
+       timeout: float = TIMEOUT) -> None:
+    """Download file if not exist.
+
+    The file is read through the asset cache, which streams the response
+    in chunks and revalidates the expired entries.
+    """
     if isfile(dist):
         return
-    with open(dist, 'wb') as f:
-        f.write(get(url).content)
+    makedirs(dirname(dist) or '.', exist_ok=True)
+    cache = asset_cache()
+    copyfile(cache.blob_path(cache.fetch(url, session=session,
+                                         timeout=timeout)), dist)
+
+
+@timed('fetch_all')
+def fetch_all(
+    urls: Iterable[str],
+    *,
+    jobs: int = 8,
+    retries: int = 3,
+    timeout: float = TIMEOUT,
+    session: Optional[Session] = None,
+    stale: bool = False,
+    prune: bool = True
+) -> Tuple[Dict[str, str], Dict[str, BaseException]]:
+    """Fetch the URLs concurrently into the asset cache.
+
+    The duplicated URLs are fetched once, and the failed downloads are
+    retried with a backoff. Return the blob paths of the fetched URLs, and
+    the errors of the URLs that still failed.
+
+    A new session is used if "session" is not given. The "stale" option is
+    passed to the asset cache, and the cache is pruned after fetched if
+    "prune" is enabled.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from requests import RequestException, HTTPError
+    cache = asset_cache()
+
+    def task(url: str) -> str:
+        for i in range(retries + 1):
+            try:
+                return cache.blob_path(cache.fetch(url, session=s,
+                                                   timeout=timeout,
+                                                   stale=stale))
+            except (RequestException, OSError) as e:
+                if i == retries or (
+                    isinstance(e, HTTPError)
+                    and e.response is not None
+                    and e.response.status_code < 500
+                ):
+                    raise
+                sleep(0.5 * 2 ** i)
+        raise AssertionError("unreachable")
+
+    blobs: Dict[str, str] = {}
+    errors: Dict[str, BaseException] = {}
+    jobs = max(1, jobs)
+    s = session or pooled_session(jobs)
+    try:
+        with ThreadPoolExecutor(jobs) as executor:
+            futures = [(url, executor.submit(task, url))
+                       for url in dict.fromkeys(urls)]
+            for url, future in futures:
+                e = future.exception()
+                if e is None:
+                    blobs[url] = future.result()
+                else:
+                    errors[url] = e
+    finally:
+        if session is None:
+            s.close()
+    if prune:
+        cache.prune()
+    return blobs, errors
 
 
 def rm(path: str) -> None:
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Tuple, List, Dict, Iterable, Iterator, Callable
+from os.path import join
+from threading import Thread, Event, Lock
+from queue import Queue, Empty
+from .cache import file_stamp, walk_links
+
+_Stamp = Tuple[int, int]
+
+
+def walk_files(path: str) -> Iterator[str]:
+    """Traverse all the files under the directory and the linked ones."""
+    for root, _, filenames in walk_links(path):
+        for filename in filenames:
+            yield join(root, filename)
+
+
+class Broadcaster:
+    """Server-Sent Events publisher."""
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.queues: List[Queue] = []
+
+    def publish(self, event: str, data: str = "") -> None:
+        """Send an event to all the subscribers."""
+        with self.lock:
+            for q in self.queues:
+                q.put((event, data))
+
+    def subscribe(self, keep_alive: float = 15) -> Iterator[str]:
+        """Generate the event stream of a subscriber."""
+        q: Queue = Queue()
+        with self.lock:
+            self.queues.append(q)
+        try:
+            while True:
+                try:
+                    event, data = q.get(timeout=keep_alive)
+                except Empty:
+                    # Comment line, keep the connection alive
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"event: {event}\ndata: {data}\n\n"
+        finally:
+            with self.lock:
+                self.queues.remove(q)
+
+
+class Watcher(Thread):
+    """Poll the stamps of the files, call back when any of them is changed.
+
+    Nothing is compiled while the files are idle.
+    """
+
+    def __init__(
+        self,
+        files: Callable[[], Iterable[str]],
+        callback: Callable[[], None],
+        interval: float = 0.5
+    ) -> None:
+        super(Watcher, self).__init__(daemon=True)
+        self.files = files
+        self.callback = callback
+        self.interval = interval
+        self.stopped = Event()
+
+    def scan(self) -> Dict[str, _Stamp]:
+        """Return the stamps of the files."""
+        return {path: file_stamp(path) for path in self.files()}
+
+    def run(self) -> None:
+        """Polling loop."""
+        stamps = self.scan()
+        while not self.stopped.wait(self.interval):
+            new_stamps = self.scan()
+            if new_stamps != stamps:
+                self.callback()
+                # Files may be added by the callback (new includes)
+                stamps = self.scan()
+
+    def stop(self) -> None:
+        """Stop the polling loop."""
+        self.stopped.set()
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of Reveal.yaml, run with "python -m pytest"."""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""Local CDN stand-in of the tests and the benchmarks."""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Tuple, List, Dict, Optional, Any
+from threading import Thread
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+_File = Tuple[bytes, Dict[str, str]]
+
+
+def _headers(headers: Dict[str, str]) -> Dict[str, str]:
+    """Header names from the keyword arguments, "_" is replaced by "-"."""
+    return {k.replace('_', '-'): v for k, v in headers.items()}
+
+
+class CDN(Thread):
+    """Local CDN stand-in, serves the files with their headers, and records
+    the requested paths.
+
+    The paths in "failures" respond 500 for the times. The missing paths
+    are served by the "fallback" file if set, otherwise 404.
+    """
+
+    def __init__(self) -> None:
+        super(CDN, self).__init__(daemon=True)
+        cdn = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self) -> None:
+                cdn.requests.append(self.path)
+                if cdn.failures.get(self.path, 0) > 0:
+                    cdn.failures[self.path] -= 1
+                    self.send_error(500)
+                    return
+                file = cdn.files.get(self.path, cdn.default)
+                if file is None:
+                    self.send_error(404)
+                    return
+                data, headers = file
+                etag = headers.get('ETag')
+                if etag and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self.files: Dict[str, _File] = {}
+        self.default: Optional[_File] = None
+        self.failures: Dict[str, int] = {}
+        self.requests: List[str] = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def put(self, path: str, data: bytes, **headers: str) -> None:
+        """Serve the data at the path."""
+        self.files[path] = (data, _headers(headers))
+
+    def fallback(self, data: bytes, **headers: str) -> None:
+        """Serve the data at the missing paths."""
+        self.default = (data, _headers(headers))
+
+    def run(self) -> None:
+        self.server.serve_forever()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
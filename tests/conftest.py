@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Iterator, Any
+from os import environ
+from os.path import join
+from tempfile import mkdtemp
+import pytest
+from .cdn import CDN
+
+# The editor creates its stores at the import
+environ['RYM_PREVIEW_STORE'] = 'memory'
+environ['RYM_EDITOR_DB'] = join(mkdtemp(prefix='rym_test_editor_'), 'swap.db')
+environ.setdefault('RYM_CACHE_DIR', mkdtemp(prefix='rym_test_cache_'))
+
+
+@pytest.fixture(autouse=True)
+def caches(tmp_path: Any, monkeypatch: Any) -> Iterator[None]:
+    """Isolate the asset cache and the in-memory caches of each test."""
+    from reveal_yaml import cache
+    from reveal_yaml.slides import section_cache, yaml_cache
+    monkeypatch.setenv('RYM_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(cache, '_ASSET_CACHE', None)
+    for c in (section_cache, yaml_cache, cache.static_indexes):
+        c.clear()
+    yield
+
+
+@pytest.fixture
+def cdn() -> Iterator[CDN]:
+    """A running CDN stand-in."""
+    server = CDN()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def project(tmp_path: Any) -> Any:
+    """Return a project folder with an empty static folder, the project
+    file is written by the test.
+    """
+    path = tmp_path / 'project'
+    (path / 'static').mkdir(parents=True)
+    return path
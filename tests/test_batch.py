@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Dict, Any
+from os import _exit
+from os.path import basename
+from reveal_yaml import batch
+
+
+def crash_or_pack(path: str, dist: str, *args: Any) -> Dict[str, Any]:
+    """Kill the worker process for the project named "crash"."""
+    if basename(path) == 'crash':
+        _exit(1)
+    return {'path': path, 'dist': dist, 'time': 0., 'error': ""}
+
+
+def test_pack_batch_worker_crashed(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, '_pack_one', crash_or_pack)
+    paths = [str(tmp_path / name) for name in ('a', 'crash', 'b')]
+    results = batch.pack_batch(paths, str(tmp_path / 'dist'), workers=1)
+    assert [r['path'] for r in results] == paths
+    assert all(set(r) == {'path', 'dist', 'time', 'error'} for r in results)
+    assert results[0]['error'] == ""
+    assert results[1]['error'].startswith("BrokenProcessPool")
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from os import listdir, utime
+from os.path import join, getsize
+from time import time
+from reveal_yaml.cache import asset_cache
+
+
+def test_replaced_blob_removed(cdn):
+    cache = asset_cache()
+    url = f"{cdn.url}/a.txt"
+    cdn.put('/a.txt', b"first", ETag='"1"', Cache_Control='no-cache')
+    old = cache.fetch(url)['blob']
+    cdn.put('/a.txt', b"second", ETag='"2"', Cache_Control='no-cache')
+    new = cache.fetch(url)['blob']
+    assert old != new
+    assert listdir(cache.blobs) == [new]
+    assert cache.stats()['blobs'] == 1
+
+
+def test_prune_orphans(cdn):
+    cache = asset_cache()
+    for i in range(3):
+        cdn.put(f'/{i}.txt', b"data" * (i + 1), Cache_Control='max-age=60')
+        cache.fetch(f"{cdn.url}/{i}.txt")
+    for i in range(4):
+        with open(join(cache.blobs, f"{i:064x}"), 'wb') as f:
+            f.write(b"orphan")
+    stats = cache.stats()
+    assert stats['blobs'] == 7
+    assert stats['size'] == 4 + 8 + 12 + 4 * 6
+    assert cache.prune() == 0
+    assert cache.stats()['blobs'] == 3
+    assert cache.prune(0) == 3
+    assert listdir(cache.blobs) == []
+    assert cache.stats()['size'] == 0
+
+
+def test_prune_least_recently_used(cdn):
+    cache = asset_cache()
+    for i in range(3):
+        cdn.put(f'/{i}.txt', b"012345678%d" % i, Cache_Control='max-age=60')
+        meta = cache.fetch(f"{cdn.url}/{i}.txt")
+        # Used in the order
+        t = time() - 100 + i
+        utime(cache.meta_path(meta['url']), (t, t))
+    cache.fetch(f"{cdn.url}/0.txt")
+    assert cache.prune(20) == 1
+    assert cache.lookup(f"{cdn.url}/1.txt") is None
+    assert cache.lookup(f"{cdn.url}/0.txt") is not None
+
+
+def test_prune_compressed_variants(cdn, tmp_path):
+    from reveal_yaml.compress import compressed
+    cache = asset_cache()
+    cdn.put('/a.txt', b"0123456789", Cache_Control='max-age=60')
+    meta = cache.fetch(f"{cdn.url}/a.txt")
+    t = time() - 100
+    utime(cache.meta_path(meta['url']), (t, t))
+    src = tmp_path / 'style.css'
+    src.write_text("body { color: red; }\n" * 100)
+    variant = compressed(str(src), 'gzip')
+    assert variant.startswith(cache.folder('static'))
+    stats = cache.stats()
+    assert stats['derived'] == 1
+    assert stats['size'] == 10 + getsize(variant)
+    # The entry is least recently used
+    assert cache.prune(getsize(variant)) == 1
+    assert cache.lookup(f"{cdn.url}/a.txt") is None
+    assert compressed(str(src), 'gzip') == variant
+    assert cache.prune(0) == 1
+    assert cache.stats()['size'] == 0
+
+
+def test_prune_bundles(project):
+    from reveal_yaml.bundle import build_bundle, bundle_folder
+    cache = asset_cache()
+    name = build_bundle(str(project / 'static'), [])
+    path = join(bundle_folder(), name)
+    stats = cache.stats()
+    assert stats['derived'] == 1
+    assert stats['size'] == getsize(path)
+    assert cache.prune(0) == 1
+    assert listdir(bundle_folder()) == []
+    # Rebuilt after pruned
+    assert build_bundle(str(project / 'static'), []) == name
+    assert listdir(bundle_folder()) == [name]
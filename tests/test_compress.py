@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from gzip import decompress
+from reveal_yaml.compress import write_compressed
+
+
+def test_write_gzip_stable(tmp_path):
+    path = tmp_path / 'style.css'
+    path.write_text("body { color: red; }\n" * 100)
+    paths = write_compressed(str(path))
+    assert str(path) + '.gz' in paths
+    gz = (tmp_path / 'style.css.gz').read_bytes()
+    assert decompress(gz) == path.read_bytes()
+    write_compressed(str(path), force=True)
+    # No timestamp in the header
+    assert (tmp_path / 'style.css.gz').read_bytes() == gz
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from reveal_yaml.slides import find_project
+from reveal_yaml.slides_app import app, deck
+
+
+def test_deck_static_file_added(project):
+    (project / 'reveal.yaml').write_text(
+        "cdn: https://cdn.example.com\n"
+        "nav:\n  - title: A\n    img:\n      - src: img/x.png\n")
+    (project / 'static' / 'img').mkdir()
+    find_project(app, str(project))
+    deck.clear()
+    client = app.test_client()
+    assert b"https://cdn.example.com/img/x.png" in client.get('/').data
+    etag = client.get('/').headers['ETag']
+    (project / 'static' / 'img' / 'x.png').write_bytes(b"png")
+    r = client.get('/', headers={'If-None-Match': etag})
+    assert r.status_code == 200
+    assert b"https://cdn.example.com/img/x.png" not in r.data
+    assert b"/static/img/x.png" in r.data
+    deck.clear()
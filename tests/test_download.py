@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from requests import HTTPError
+from reveal_yaml.utility import fetch_all
+from reveal_yaml.slides import Config, copy_project, project_yaml
+from reveal_yaml.slides_app import app
+
+
+def test_fetch_all_deduplicates(cdn):
+    cdn.put('/a.png', b"a", Cache_Control='max-age=60')
+    cdn.put('/b.png', b"b", Cache_Control='max-age=60')
+    urls = [f"{cdn.url}/a.png", f"{cdn.url}/b.png", f"{cdn.url}/a.png"]
+    blobs, errors = fetch_all(urls, jobs=4)
+    assert not errors
+    assert sorted(cdn.requests) == ['/a.png', '/b.png']
+    with open(blobs[urls[0]], 'rb') as f:
+        assert f.read() == b"a"
+
+
+def test_fetch_all_retries(cdn):
+    cdn.put('/a.png', b"a")
+    cdn.failures['/a.png'] = 1
+    blobs, errors = fetch_all([f"{cdn.url}/a.png"], retries=1)
+    assert not errors and len(blobs) == 1
+    assert cdn.requests == ['/a.png', '/a.png']
+
+
+def test_fetch_all_client_error(cdn):
+    blobs, errors = fetch_all([f"{cdn.url}/missing.png"], retries=3)
+    assert not blobs
+    assert isinstance(errors[f"{cdn.url}/missing.png"], HTTPError)
+    # The client errors are not retried
+    assert cdn.requests == ['/missing.png']
+
+
+def test_pack_from_cdn(cdn, project, tmp_path):
+    cdn.put('/img/icon.png', b"icon", Cache_Control='max-age=60')
+    cdn.put('/img/1.png', b"one", Cache_Control='max-age=60')
+    (project / 'reveal.yaml').write_text(
+        f"cdn: {cdn.url}\n"
+        "nav:\n"
+        "  - title: A\n"
+        "    img:\n"
+        "      - src: img/1.png\n"
+        "      - src: img/1.png\n")
+    build = tmp_path / 'build'
+    config = Config(nav=[{'title': "A", 'img': [{'src': "img/1.png"},
+                                                {'src': "img/1.png"}]}],
+                    cdn=cdn.url)
+    with app.app_context():
+        for _ in range(2):
+            copy_project(config, str(project), str(build),
+                         project=project_yaml(str(project)))
+    assert (build / 'static' / 'img' / '1.png').read_bytes() == b"one"
+    assert (build / 'static' / 'img' / 'icon.png').read_bytes() == b"icon"
+    # Packed again from the asset cache
+    assert sorted(cdn.requests) == ['/img/1.png', '/img/icon.png']
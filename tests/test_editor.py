@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+import pytest
+from reveal_yaml.slides import find_project
+from reveal_yaml.editor import app
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def post(client, data) -> str:
+    """Post the config, return its preview URL."""
+    r = client.post('/preview/0', json=data)
+    assert r.status_code == 200
+    return f"/preview/{r.get_json()['id']}"
+
+
+def test_preview(client):
+    r = client.get(post(client, {'nav': [{'title': "Preview"}]}))
+    assert r.status_code == 200
+    assert b"Preview" in r.data
+
+
+def test_preview_expired(client):
+    r = client.get('/preview/1234')
+    assert r.status_code == 410
+    assert r.data.startswith(b"<pre>")
+
+
+def test_preview_invalid(client):
+    r = client.get(post(client, {'nav': [{'title': 1}]}))
+    assert r.status_code == 400
+    assert r.data.startswith(b"<pre>")
+
+
+def test_preview_include_changed(client, project):
+    url = post(client, {'nav': [{'title': "A", 'include': "inc.md"}]})
+    (project / 'reveal.yaml').write_text("nav:\n  - title: Project\n")
+    (project / 'static' / 'inc.md').write_text("First version")
+    find_project(app, str(project))
+    assert b"First version" in client.get(url).data
+    r = client.get(url)
+    assert r.cache_control.no_cache and r.cache_control.private
+    etag = r.headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    (project / 'static' / 'inc.md').write_text("Second version!")
+    r = client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 200
+    assert b"Second version!" in r.data
+
+
+def test_chapter_rejected(client):
+    url = post(client, {'nav': [{'title': "A"}, {'chapter': "b.yaml"}]})
+    r = client.get(url)
+    assert r.status_code == 400
+    assert b"chapter" in r.data
+    r = client.get(url.replace('/preview/', '/pack/'))
+    assert r.status_code == 400
+
+
+def test_workers_start_together(monkeypatch):
+    from reveal_yaml import editor
+    table = editor.doc_table()
+    table.delete()
+    # Both workers see no rows before inserted
+    monkeypatch.setattr(type(table), 'find_one', lambda self, **kw: None)
+    with app.test_request_context():
+        editor.before_first_request()
+        editor.before_first_request()
+    assert len(list(table.all())) == 2
+
+
+def test_pack_not_modified(client):
+    url = post(client, {'nav': [{'title': "A"}]})
+    url = url.replace('/preview/', '/pack/')
+    r = client.get(url)
+    assert r.status_code == 200
+    assert r.data.startswith(b"PK")
+    etag = r.headers['ETag']
+    r = client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 304
+    assert not r.data
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from copy import copy, deepcopy
+from pickle import dumps, loads
+import pytest
+from reveal_yaml.slides import Config, Size, slide_content
+
+
+def make_config() -> Config:
+    return Config(nav=[
+        {'title': "A", 'sub': [{'title': "B", 'embed': {'src': "b.pdf"}}]},
+        {'title': "C", 'youtube': {'src': "https://youtu.be/x"}},
+    ])
+
+
+def same_content(a: Config, b: Config) -> bool:
+    return ([slide_content(n) for _, _, n in a.slides]
+            == [slide_content(n) for _, _, n in b.slides])
+
+
+def test_shared_defaults():
+    config = make_config()
+    n = config.nav[0]
+    assert not hasattr(n, '__dict__')
+    assert n.youtube is n.sub[0].youtube
+    assert n.fragment is config.nav[1].fragment
+    assert isinstance(n.youtube, Size)
+    assert (n.embed.width, n.embed.height) == ("1000px", "450px")
+    with pytest.raises(AttributeError):
+        n.youtube.src = "x"
+
+
+def test_copy_shared_defaults():
+    config = make_config()
+    assert copy(config.nav[0].youtube) is config.nav[0].youtube
+    cloned = deepcopy(config)
+    assert cloned.nav[0] is not config.nav[0]
+    assert cloned.nav[0].youtube is config.nav[0].youtube
+    assert same_content(config, cloned)
+
+
+def test_pickle_shared_defaults():
+    config = make_config()
+    restored = loads(dumps(config))
+    assert restored.nav[0].youtube is config.nav[0].youtube
+    assert restored.nav[0].embed is config.nav[0].embed
+    assert restored.nav[0].sub[0].embed.src == "b.pdf"
+    assert same_content(config, restored)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from os import symlink
+from reveal_yaml.cache import static_index
+from reveal_yaml.slides import Config, copy_project, project_yaml
+from reveal_yaml.slides_app import app
+
+
+def test_pack_linked_folder(project, tmp_path):
+    lib = tmp_path / 'lib'
+    lib.mkdir()
+    (lib / 'a.js').write_text("let a;")
+    symlink(str(lib), str(project / 'static' / 'lib'))
+    # A link to its ancestor is not walked again
+    symlink(str(project / 'static'), str(lib / 'loop'))
+    (project / 'reveal.yaml').write_text("nav:\n  - title: A\n")
+    (project / 'static' / 'img').mkdir()
+    (project / 'static' / 'img' / 'icon.png').write_bytes(b"icon")
+    index = static_index(str(project / 'static'))
+    assert 'lib/a.js' in index
+    assert not any(rel.startswith('lib/loop/') for rel in index.files)
+    build = tmp_path / 'build'
+    with app.app_context():
+        copy_project(Config(nav=[{'title': "A"}]), str(project), str(build),
+                     project=project_yaml(str(project)))
+    assert (build / 'static' / 'lib' / 'a.js').read_text() == "let a;"
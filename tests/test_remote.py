@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from time import sleep, monotonic
+import pytest
+from reveal_yaml.slides import find_project
+from reveal_yaml.slides_app import app, deck
+
+
+@pytest.fixture
+def client(cdn, project):
+    """Serve a project that includes a remote file."""
+    cdn.put('/doc/inc.md', b"First version", ETag='"1"',
+            Cache_Control='max-age=1, stale-while-revalidate=60')
+    (project / 'reveal.yaml').write_text(
+        f"cdn: {cdn.url}\nnav:\n  - title: A\n    include: doc/inc.md\n")
+    find_project(app, str(project))
+    deck.clear()
+    yield app.test_client()
+    deck.clear()
+
+
+def test_remote_include_fresh(cdn, client):
+    assert b"First version" in client.get('/').data
+    assert b"First version" in client.get('/').data
+    # The deck is cached before the include is expired
+    assert cdn.requests == ['/doc/inc.md']
+
+
+def test_remote_include_expired(cdn, client):
+    assert b"First version" in client.get('/').data
+    cdn.put('/doc/inc.md', b"Second version", ETag='"2"',
+            Cache_Control='max-age=60')
+    sleep(1.1)
+    end = monotonic() + 5
+    while monotonic() < end:
+        if b"Second version" in client.get('/').data:
+            break
+        sleep(0.2)
+    else:
+        pytest.fail("the remote include is not updated")
+    requests = len(cdn.requests)
+    assert b"Second version" in client.get('/').data
+    assert len(cdn.requests) == requests
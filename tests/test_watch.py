@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2019-2020"
+__license__ = "MIT"
+__email__ = "pyslvs@gmail.com"
+
+from typing import List, Callable, Any
+from os import replace
+from time import sleep, monotonic
+import pytest
+from reveal_yaml.slides import find_project
+from reveal_yaml.slides_app import app, deck, events, watch
+
+
+def write(path: Any, text: str) -> None:
+    """Replace the file at once, so the watcher never sees a partial file."""
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(text)
+    replace(tmp, path)
+
+
+def wait(condition: Callable[[], bool], timeout: float = 5.) -> bool:
+    """Wait until the condition is true."""
+    end = monotonic() + timeout
+    while monotonic() < end:
+        if condition():
+            return True
+        sleep(0.02)
+    return condition()
+
+
+@pytest.fixture
+def watched(project, monkeypatch):
+    """Watch the project, return the published events."""
+    write(project / 'reveal.yaml', "nav:\n  - title: First\n")
+    find_project(app, str(project))
+    published: List[str] = []
+    monkeypatch.setattr(events, 'publish',
+                        lambda event, data="": published.append(event))
+    deck.clear()
+    watcher = watch(interval=0.02)
+    yield published
+    watcher.stop()
+    watcher.join()
+    app.config['WATCH'] = False
+    deck.clear()
+
+
+def test_watch_recovers_from_error(project, watched):
+    assert watched == ['reload'] and deck.stamps
+    # Wait for the first scan of the watcher
+    sleep(0.1)
+    write(project / 'reveal.yaml', "nav: [\n")
+    assert wait(lambda: len(watched) == 2)
+    assert not deck.stamps
+    write(project / 'reveal.yaml', "nav:\n  - title: Second slide\n")
+    assert wait(lambda: len(watched) == 3)
+    assert deck.stamps
+    assert b"Second slide" in b"".join(deck.chunks)
+
+
+def test_watch_chapters(project, watched):
+    sleep(0.1)
+    write(project / 'chapter.yaml', "title: Chapter\n")
+    write(project / 'reveal.yaml',
+          "nav:\n  - title: First\n  - chapter: chapter.yaml\n")
+    assert wait(lambda: len(watched) == 2)
+    assert b"Chapter" in b"".join(deck.chunks)
+    write(project / 'chapter.yaml', "title: Changed chapter\n")
+    assert wait(lambda: len(watched) == 3)
+    assert b"Changed chapter" in b"".join(deck.chunks)
+
+
+def test_error_page_reloads(project, watched):
+    write(project / 'reveal.yaml', "nav: [\n")
+    deck.clear()
+    r = app.test_client().get('/')
+    assert r.status_code == 500
+    assert b'new EventSource("/events")' in r.data
+
+
+def test_events_without_watch():
+    assert app.test_client().get('/events').status_code == 404